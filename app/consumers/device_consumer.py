@@ -0,0 +1,225 @@
+# app/consumers/device_consumer.py
+import asyncio
+import functools
+import json
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+from kafka.structs import OffsetAndMetadata
+from pydantic import ValidationError
+from app.models.device_models import DeviceData
+from app.db.device_store import insert_readings
+from app.db.alert_store import load_alert_engine, refresh_alert_config
+from app.utils.metrics import REGISTRY
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+KAFKA_BOOTSTRAP_SERVERS = os.getenv("KAFKA_BOOTSTRAP_SERVERS")
+KAFKA_TOPIC = os.getenv("KAFKA_TOPIC", "device_data")
+KAFKA_GROUP_ID = os.getenv("KAFKA_GROUP_ID", "scm-device-consumer")
+KAFKA_BATCH_SIZE = int(os.getenv("KAFKA_BATCH_SIZE", 500))
+KAFKA_BATCH_SECONDS = float(os.getenv("KAFKA_BATCH_SECONDS", 1.0))
+KAFKA_MAX_PENDING_BATCHES = int(os.getenv("KAFKA_MAX_PENDING_BATCHES", 4))
+# Run the consumer inside each API worker instead of as its own process
+KAFKA_EMBEDDED_CONSUMER = os.getenv("KAFKA_EMBEDDED_CONSUMER", "false").lower() in ("1", "true", "yes")
+
+# consumers started in this process, reported by /metrics
+running_consumers = set()
+
+
+class ConsumerStats:
+    def __init__(self):
+        self.started = time.monotonic()
+        self.consumed = 0
+        self.written = 0
+        self.invalid = 0
+        self.write_errors = 0
+        self.batches = 0
+        self.commits = 0
+        self.write_retries = 0
+        self.paused = 0
+        self.lag = 0
+        self.last_write_seconds = 0.0
+
+    def snapshot(self) -> dict:
+        stats = dict(vars(self))
+        elapsed = time.monotonic() - stats.pop("started")
+        stats["messages_per_second"] = self.written / elapsed if elapsed else 0.0
+        return stats
+
+
+# Reads DeviceData messages in micro-batches and writes each batch with one
+# insert_many through the shared Motor client. Offsets are committed only
+# after the batch is written; invalid messages are counted and skipped.
+#
+# The poller hands batches to the writer through a bounded queue. When Mongo
+# is slow the queue fills up and the poller pauses its partitions (it keeps
+# polling so the group membership stays alive) until the writer catches up.
+# kafka-python is not thread safe, so every consumer call runs on one thread.
+class DeviceConsumer:
+    def __init__(self, consumer, sink=insert_readings, batch_size: int = KAFKA_BATCH_SIZE,
+                 batch_seconds: float = KAFKA_BATCH_SECONDS, max_pending_batches: int = KAFKA_MAX_PENDING_BATCHES):
+        self.consumer = consumer
+        self.sink = sink
+        self.batch_size = batch_size
+        self.batch_seconds = batch_seconds
+        self.queue = asyncio.Queue(maxsize=max_pending_batches)
+        self.space = asyncio.Event()
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="kafka-consumer")
+        self.stats = ConsumerStats()
+        self.tasks = []
+
+    async def _call(self, fn, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, functools.partial(fn, *args, **kwargs))
+
+    def _poll(self, timeout_ms: int, max_records: int):
+        records = self.consumer.poll(timeout_ms=timeout_ms, max_records=max_records)
+        lag = 0
+        for tp in self.consumer.assignment():
+            highwater = self.consumer.highwater(tp)
+            if highwater is not None:
+                lag += max(0, highwater - self.consumer.position(tp))
+        self.stats.lag = lag
+        return records
+
+    def _decode(self, record):
+        try:
+            return DeviceData.model_validate(json.loads(record.value)).model_dump()
+        except (ValueError, ValidationError):
+            self.stats.invalid += 1
+            return None
+
+    async def _poll_batches(self):
+        while True:
+            docs, offsets, count = [], {}, 0
+            deadline = time.monotonic() + self.batch_seconds
+            while count < self.batch_size and time.monotonic() < deadline:
+                if self.queue.full():
+                    await self._wait_for_writer()
+                timeout_ms = max(1, int((deadline - time.monotonic()) * 1000))
+                records = await self._call(self._poll, timeout_ms, self.batch_size - count)
+                for tp, batch in records.items():
+                    for record in batch:
+                        count += 1
+                        self.stats.consumed += 1
+                        doc = self._decode(record)
+                        if doc is not None:
+                            docs.append(doc)
+                        offsets[tp] = record.offset
+            if offsets:
+                await self.queue.put((docs, offsets))
+
+    # Backpressure: stop fetching while the writer is behind
+    async def _wait_for_writer(self):
+        partitions = await self._call(self.consumer.assignment)
+        await self._call(self.consumer.pause, *partitions)
+        self.stats.paused += 1
+        try:
+            while True:
+                self.space.clear()
+                if not self.queue.full():
+                    break
+                try:
+                    await asyncio.wait_for(self.space.wait(), 1.0)
+                except asyncio.TimeoutError:
+                    # paused partitions return nothing; polling keeps the group membership alive
+                    await self._call(self.consumer.poll, timeout_ms=0)
+        finally:
+            await self._call(self.consumer.resume, *partitions)
+
+    async def _write_batches(self):
+        while True:
+            docs, offsets = await self.queue.get()
+            self.space.set()
+            delay = 0.5
+            while True:
+                try:
+                    started = time.monotonic()
+                    written, errors = await self.sink(docs)
+                    self.stats.last_write_seconds = time.monotonic() - started
+                    break
+                except Exception:
+                    # insert_readings raises only when the raw insert failed, before
+                    # any rollup was counted: keep the offsets uncommitted and retry
+                    logger.exception("Writing %d device readings failed, retrying", len(docs))
+                    self.stats.write_retries += 1
+                    await asyncio.sleep(delay)
+                    delay = min(delay * 2, 30)
+            self.stats.written += written
+            self.stats.write_errors += len(errors)
+            self.stats.batches += 1
+            commit = {tp: OffsetAndMetadata(offset + 1, "", -1) for tp, offset in offsets.items()}
+            try:
+                await self._call(self.consumer.commit, commit)
+                self.stats.commits += 1
+            except Exception:
+                # e.g. the partitions were reassigned; they will be redelivered
+                logger.exception("Committing device consumer offsets failed")
+            self.queue.task_done()
+
+    def start(self):
+        running_consumers.add(self)
+        self.tasks = [asyncio.create_task(self._poll_batches()), asyncio.create_task(self._write_batches())]
+
+    async def stop(self, drain_seconds: float = 30):
+        if self.tasks:
+            # stop polling, then give the writer a chance to commit what it has
+            self.tasks[0].cancel()
+            try:
+                await asyncio.wait_for(self.queue.join(), drain_seconds)
+            except asyncio.TimeoutError:
+                logger.warning("Device consumer stopped with %d batches unwritten", self.queue.qsize())
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+        running_consumers.discard(self)
+        await self._call(self.consumer.close)
+        self.executor.shutdown(wait=False)
+
+
+@REGISTRY.register_collector
+def _collect_consumers():
+    snapshots = [c.stats.snapshot() for c in running_consumers]
+    for key, type in (("consumed", "counter"), ("written", "counter"), ("invalid", "counter"),
+                      ("write_errors", "counter"), ("write_retries", "counter"), ("paused", "counter"),
+                      ("lag", "gauge"), ("messages_per_second", "gauge")):
+        name = f"kafka_consumer_{key}" + ("_total" if type == "counter" else "")
+        yield (name, f"Device consumer {key.replace('_', ' ')}", type,
+               [({"consumer": str(i)}, s[key]) for i, s in enumerate(snapshots)])
+
+
+def create_kafka_consumer():
+    from kafka import KafkaConsumer
+    return KafkaConsumer(
+        KAFKA_TOPIC,
+        bootstrap_servers=KAFKA_BOOTSTRAP_SERVERS,
+        group_id=KAFKA_GROUP_ID,
+        enable_auto_commit=False,
+        auto_offset_reset="earliest",
+        max_poll_records=KAFKA_BATCH_SIZE,
+    )
+
+
+async def run():
+    # readings consumed here are checked against the alert rules like HTTP ingest
+    await load_alert_engine()
+    alert_refresher = asyncio.create_task(refresh_alert_config())
+    device_consumer = DeviceConsumer(create_kafka_consumer())
+    device_consumer.start()
+    try:
+        while True:
+            await asyncio.sleep(60)
+            logger.info("Device consumer stats: %s", device_consumer.stats.snapshot())
+    finally:
+        alert_refresher.cancel()
+        await device_consumer.stop()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(run())
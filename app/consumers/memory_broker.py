@@ -0,0 +1,92 @@
+# app/consumers/memory_broker.py
+import threading
+import time
+from collections import namedtuple
+from kafka import TopicPartition
+
+# In-process stand-in for Kafka with the subset of the KafkaConsumer API that
+# DeviceConsumer uses (poll/commit/pause/resume/highwater/position), for tests
+# and benchmarks that should not need a broker.
+Record = namedtuple("Record", ["topic", "partition", "offset", "key", "value"])
+
+
+class MemoryBroker:
+    def __init__(self, partitions: int = 1):
+        self.partitions = partitions
+        self.logs = {}
+        self.committed = {}
+        self.cond = threading.Condition()
+
+    def produce(self, topic: str, value: bytes, key: bytes = None, partition: int = None):
+        with self.cond:
+            if partition is None:
+                partition = hash(key) % self.partitions if key is not None else 0
+            log = self.logs.setdefault(TopicPartition(topic, partition), [])
+            log.append(Record(topic, partition, len(log), key, value))
+            self.cond.notify_all()
+
+    def consumer(self, topic: str, group_id: str = "test"):
+        return MemoryConsumer(self, topic, group_id)
+
+
+class MemoryConsumer:
+    def __init__(self, broker: MemoryBroker, topic: str, group_id: str):
+        self.broker = broker
+        self.group_id = group_id
+        self.partitions = {TopicPartition(topic, p) for p in range(broker.partitions)}
+        self.paused_partitions = set()
+        self.positions = {tp: broker.committed.get((group_id, tp), 0) for tp in self.partitions}
+
+    def _fetch(self, max_records):
+        records = {}
+        budget = max_records or float("inf")
+        for tp in sorted(self.partitions - self.paused_partitions):
+            log = self.broker.logs.get(tp, [])
+            batch = log[self.positions[tp]:self.positions[tp] + int(min(budget, len(log)))]
+            if batch:
+                records[tp] = batch
+                self.positions[tp] += len(batch)
+                budget -= len(batch)
+            if budget <= 0:
+                break
+        return records
+
+    def poll(self, timeout_ms: int = 0, max_records: int = None):
+        deadline = time.monotonic() + timeout_ms / 1000
+        with self.broker.cond:
+            while True:
+                records = self._fetch(max_records)
+                remaining = deadline - time.monotonic()
+                if records or remaining <= 0:
+                    return records
+                self.broker.cond.wait(remaining)
+
+    def commit(self, offsets=None):
+        with self.broker.cond:
+            offsets = offsets or {tp: pos for tp, pos in self.positions.items()}
+            for tp, meta in offsets.items():
+                self.broker.committed[(self.group_id, tp)] = getattr(meta, "offset", meta)
+
+    def committed(self, tp):
+        return self.broker.committed.get((self.group_id, tp))
+
+    def pause(self, *partitions):
+        self.paused_partitions.update(partitions)
+
+    def resume(self, *partitions):
+        self.paused_partitions.difference_update(partitions)
+
+    def paused(self):
+        return set(self.paused_partitions)
+
+    def assignment(self):
+        return set(self.partitions)
+
+    def position(self, tp):
+        return self.positions[tp]
+
+    def highwater(self, tp):
+        return len(self.broker.logs.get(tp, []))
+
+    def close(self):
+        pass
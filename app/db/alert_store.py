@@ -0,0 +1,118 @@
+# app/db/alert_store.py
+import asyncio
+import logging
+import os
+from datetime import datetime, timezone
+from bson import ObjectId
+from pymongo import DESCENDING, ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from app.db.mongodb import db, dashboard_db
+from app.utils.alerts import alert_engine
+from app.utils.device_hub import DeviceHub
+
+logger = logging.getLogger(__name__)
+
+# Rules and shipment links are re-read this often, so rules added through
+# another worker and new shipments take effect everywhere
+ALERT_CONFIG_REFRESH_SECONDS = float(os.getenv("ALERT_CONFIG_REFRESH_SECONDS", 30))
+# Open and resolved alerts are pushed to /device/ws/alerts through this hub
+alert_hub = DeviceHub()
+
+
+async def _device_goods() -> dict:
+    device_goods = {}
+    async for doc in db.shipments.find({"deviceIds.0": {"$exists": True}}, {"deviceIds": 1, "goodsType": 1}):
+        for device_id in doc["deviceIds"]:
+            device_goods.setdefault(device_id, set()).add(doc.get("goodsType"))
+    return device_goods
+
+
+# Open alerts of rules that no longer exist would never be resolved (the
+# engine drops their state), so they are resolved here
+async def _resolve_orphaned_alerts(rule_ids: list):
+    orphans = await db.alerts.find({"status": "open", "rule_id": {"$nin": rule_ids}}).to_list(None)
+    if not orphans:
+        return
+    resolved = {"status": "resolved", "resolved_at": datetime.now(timezone.utc), "resolved_reason": "rule deleted"}
+    await db.alerts.update_many({"_id": {"$in": [alert["_id"] for alert in orphans]}, "status": "open"},
+                                {"$set": resolved})
+    for alert in orphans:
+        alert_hub.publish({**alert, **resolved, "event": "resolved"})
+
+
+async def reload_alert_config():
+    rules = await db.alert_rules.find({}).to_list(None)
+    alert_engine.set_rules(rules)
+    alert_engine.set_device_goods(await _device_goods())
+    await _resolve_orphaned_alerts([str(rule["_id"]) for rule in rules])
+    # API workers and consumers each evaluate alerts: pick up what the others opened and resolved
+    alert_engine.restore(await db.alerts.find({"status": "open"}).to_list(None))
+
+
+async def load_alert_engine():
+    await reload_alert_config()
+
+
+async def refresh_alert_config():
+    while True:
+        await asyncio.sleep(ALERT_CONFIG_REFRESH_SECONDS)
+        try:
+            await reload_alert_config()
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Could not reload alert rules")
+
+
+# Stores a new alert unless another process already has one open for the
+# same rule and device (open_rule_device_unique); returns the open alert
+async def _open_alert(alert: dict) -> dict:
+    key = {"rule_id": alert["rule_id"], "device_id": alert["device_id"], "status": "open"}
+    try:
+        return await db.alerts.find_one_and_update(key, {"$setOnInsert": alert}, upsert=True,
+                                                   return_document=ReturnDocument.AFTER)
+    except DuplicateKeyError:
+        # lost a race with a concurrent upsert; theirs is the open one
+        return await db.alerts.find_one(key)
+
+
+# Persists the events from AlertEngine.evaluate and pushes them to subscribers.
+# Events another process already stored are adopted, not published again.
+async def record_alerts(events: list):
+    for kind, alert in events:
+        try:
+            if kind == "open":
+                stored = await _open_alert(alert)
+                if stored is not None and stored["_id"] != alert["_id"]:
+                    alert_engine.adopt(stored, alert)
+                    continue
+            else:
+                result = await db.alerts.update_one({"_id": alert["_id"], "status": "open"}, {"$set": {
+                    "status": "resolved", "resolved_at": alert["resolved_at"], "resolved_value": alert["resolved_value"]}})
+                if result.matched_count == 0:
+                    continue
+        except Exception:
+            logger.exception("Could not store %s alert for %s", kind, alert["device_id"])
+        alert_hub.publish({**alert, "event": kind})
+
+
+async def create_rule(rule: dict) -> str:
+    result = await db.alert_rules.insert_one(rule)
+    await reload_alert_config()
+    return str(result.inserted_id)
+
+
+async def delete_rule(rule_id: str) -> bool:
+    result = await db.alert_rules.delete_one({"_id": ObjectId(rule_id)})
+    await reload_alert_config()
+    return result.deleted_count > 0
+
+
+async def list_rules() -> list:
+    return [{**doc, "_id": str(doc["_id"])} async for doc in dashboard_db.alert_rules.find({})]
+
+
+async def list_alerts(status: str = None, device_id: str = None, limit: int = 100) -> list:
+    query_filter = {k: v for k, v in {"status": status, "device_id": device_id}.items() if v}
+    cursor = dashboard_db.alerts.find(query_filter).sort([("opened_at", DESCENDING)]).limit(limit)
+    return [{**doc, "_id": str(doc["_id"])} async for doc in cursor]
@@ -0,0 +1,327 @@
+# app/db/device_store.py
+import logging
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from fastapi import HTTPException
+from pymongo import DESCENDING, UpdateOne
+from pymongo.errors import BulkWriteError, CollectionInvalid, PyMongoError
+from app.db.mongodb import db, dashboard_db
+from app.utils.metrics import REGISTRY
+from app.utils.ingest_buffer import IngestBuffer
+from app.utils.device_hub import device_hub
+from app.utils.latest_readings import LatestReadings, epoch
+from app.utils.alerts import alert_engine
+from app.db.alert_store import record_alerts
+from app.utils.cache import cache
+from app.utils.pagination import encode_cursor, decode_cursor, keyset_filter
+
+logger = logging.getLogger(__name__)
+
+# Raw readings live in a time-series collection (metaField device_id) unless
+# DEVICE_TIMESERIES is turned off; per-device rollups are kept alongside them
+# so long windows can be answered without scanning raw readings.
+USE_TIMESERIES = os.getenv("DEVICE_TIMESERIES", "true").lower() in ("1", "true", "yes")
+ROLLUP_GRANULARITIES = {"minute": 60, "hour": 3600}
+ROLLUP_METRICS = ("sensor_temperature", "battery_level")
+# With DEVICE_CHANGE_STREAM on, WebSocket subscribers are fed from a change
+# stream on device_data instead of by the worker that did the insert. Only
+# for a plain (DEVICE_TIMESERIES=false) collection; startup checks that.
+USE_CHANGE_STREAM = os.getenv("DEVICE_CHANGE_STREAM", "false").lower() in ("1", "true", "yes")
+# Latest reading per device as seen by this worker; device_latest is the shared copy
+latest_readings = LatestReadings(ttl=float(os.getenv("LATEST_READING_TTL", 5)))
+DEVICE_LIST_TTL = float(os.getenv("DEVICE_LIST_TTL", 600))
+# Newest-first order of raw readings, matching the indexes in app/db/indexes.py.
+# Time-series indexes can't include _id, so there the order is by time alone
+# and readings sharing a timestamp come back in no fixed order; see
+# readings_after_filter for how pages stay exact anyway.
+READINGS_SORT = [("timestamp", DESCENDING)] if USE_TIMESERIES else [("timestamp", DESCENDING), ("_id", DESCENDING)]
+
+# Keyset pagination over READINGS_SORT. Sorted on (timestamp, _id) the cursor
+# is the last row's (timestamp, _id). Sorted on timestamp alone, ties have no
+# order to resume from, so the cursor is the last timestamp plus the _ids
+# already returned at that timestamp, and the next page starts at that
+# timestamp again without them.
+def readings_after_filter(after: str) -> dict:
+    last_ts, last = decode_cursor(after)
+    if USE_TIMESERIES:
+        return {"timestamp": {"$lte": last_ts}, "_id": {"$nin": last if isinstance(last, list) else [last]}}
+    if isinstance(last, list):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return keyset_filter("timestamp", last_ts, last)
+
+def next_readings_cursor(rows: list, after: str = None) -> str:
+    last_ts = rows[-1]["timestamp"]
+    if not USE_TIMESERIES:
+        return encode_cursor(last_ts, rows[-1]["_id"])
+    seen = [row["_id"] for row in rows if row["timestamp"] == last_ts]
+    if after:
+        previous_ts, previous = decode_cursor(after)
+        if epoch(previous_ts) == epoch(last_ts):
+            # a run of equal timestamps longer than a page
+            seen = (previous if isinstance(previous, list) else [previous]) + seen
+    return encode_cursor(last_ts, seen)
+
+async def ensure_device_storage():
+    if USE_TIMESERIES:
+        try:
+            await db.create_collection("device_data", timeseries={
+                "timeField": "timestamp", "metaField": "device_id", "granularity": "seconds"})
+        except CollectionInvalid:
+            # already exists; a collection from before time series stays a plain one
+            info = await db.list_collections(filter={"name": "device_data"}).to_list(1)
+            if info and info[0].get("type") != "timeseries":
+                logger.warning("device_data is a plain collection, not time series; readings keep being "
+                               "stored there. Migrate them into a time-series collection to change that.")
+    if USE_CHANGE_STREAM:
+        # change streams can't be opened on a time-series collection, and with
+        # them on nothing else feeds the hub: refuse rather than stream nothing
+        info = await db.list_collections(filter={"name": "device_data"}).to_list(1)
+        if info and info[0].get("type") == "timeseries":
+            raise RuntimeError("DEVICE_CHANGE_STREAM needs a plain device_data collection, but it is time series; "
+                               "turn DEVICE_CHANGE_STREAM off or use DEVICE_TIMESERIES=false on a new database")
+
+# Rebuilds the rollups from the raw readings, one aggregation per granularity
+# merged into device_rollups (replacing matching buckets). Only run it while
+# nothing is ingesting: readings written during the rebuild can be lost from
+# the buckets it replaces, which is why startup only checks for it.
+#   python -m app.db.device_store --backfill-rollups
+async def backfill_rollups() -> bool:
+    if await db.device_data.find_one({}, {"_id": 1}) is None:
+        return False
+    started = time.perf_counter()
+    for granularity, size in ROLLUP_GRANULARITIES.items():
+        millis = {"$toLong": "$timestamp"}
+        group = {"_id": {"device_id": "$device_id",
+                         "bucket": {"$toDate": {"$subtract": [millis, {"$mod": [millis, size * 1000]}]}}},
+                 "count": {"$sum": 1}}
+        project = {"_id": 0, "device_id": "$_id.device_id", "granularity": granularity, "bucket": "$_id.bucket",
+                   "count": 1}
+        for metric in ROLLUP_METRICS:
+            for name, op in (("sum", "$sum"), ("min", "$min"), ("max", "$max")):
+                group[f"{metric}_{name}"] = {op: f"${metric}"}
+                project[f"{metric}_{name}"] = 1
+        pipeline = [
+            {"$group": group},
+            {"$project": project},
+            {"$merge": {"into": "device_rollups", "on": ["device_id", "granularity", "bucket"],
+                        "whenMatched": "replace", "whenNotMatched": "insert"}},
+        ]
+        try:
+            await db.device_data.aggregate(pipeline, allowDiskUse=True).to_list(None)
+        except PyMongoError:
+            # e.g. a server without $merge (before 4.2); serve without the history
+            logger.exception("Could not rebuild %s rollups from raw readings", granularity)
+            return False
+    cache.invalidate("device_data", "devices")
+    logger.info("Rebuilt device rollups from raw readings in %.1fs", time.perf_counter() - started)
+    return True
+
+
+# Startup check for the first start after upgrading from raw-only storage:
+# the charts read rollups, so without a backfill they miss older history
+async def check_rollups():
+    if await db.device_rollups.find_one({}, {"_id": 1}) is not None:
+        return
+    if await db.device_data.find_one({}, {"_id": 1}) is None:
+        return
+    logger.warning("device_rollups is empty but device_data has readings; charts will miss older history "
+                   "until `python -m app.db.device_store --backfill-rollups` is run (stop ingestion first)")
+
+
+def bucket_start(ts: datetime, size: int) -> datetime:
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=timezone.utc)
+    return datetime.fromtimestamp(int(ts.timestamp()) // size * size, timezone.utc)
+
+# Folds the readings into one upsert per (device, granularity, bucket)
+async def update_rollups(docs: list):
+    buckets = {}
+    for doc in docs:
+        for granularity, size in ROLLUP_GRANULARITIES.items():
+            key = (doc["device_id"], granularity, bucket_start(doc["timestamp"], size))
+            agg = buckets.get(key)
+            if agg is None:
+                agg = buckets[key] = {"count": 0}
+                for metric in ROLLUP_METRICS:
+                    agg[f"{metric}_sum"] = 0.0
+                    agg[f"{metric}_min"] = doc[metric]
+                    agg[f"{metric}_max"] = doc[metric]
+            agg["count"] += 1
+            for metric in ROLLUP_METRICS:
+                agg[f"{metric}_sum"] += doc[metric]
+                agg[f"{metric}_min"] = min(agg[f"{metric}_min"], doc[metric])
+                agg[f"{metric}_max"] = max(agg[f"{metric}_max"], doc[metric])
+
+    ops = []
+    for (device_id, granularity, bucket), agg in buckets.items():
+        update = {"$inc": {"count": agg["count"]}, "$min": {}, "$max": {}}
+        for metric in ROLLUP_METRICS:
+            update["$inc"][f"{metric}_sum"] = agg[f"{metric}_sum"]
+            update["$min"][f"{metric}_min"] = agg[f"{metric}_min"]
+            update["$max"][f"{metric}_max"] = agg[f"{metric}_max"]
+        ops.append(UpdateOne({"device_id": device_id, "granularity": granularity, "bucket": bucket}, update, upsert=True))
+    if ops:
+        await db.device_rollups.bulk_write(ops, ordered=False)
+
+def _reading(doc: dict) -> dict:
+    return {k: v for k, v in doc.items() if k != "_id"}
+
+# device_latest holds one document per device (_id = device_id). The filter
+# only matches an older reading, so when a newer one is stored the upsert
+# hits the _id unique index and is skipped.
+async def update_latest(docs: list):
+    newest = {}
+    for doc in docs:
+        current = newest.get(doc["device_id"])
+        if current is None or epoch(current["timestamp"]) <= epoch(doc["timestamp"]):
+            newest[doc["device_id"]] = doc
+    latest_readings.update_many(newest.values())
+    ops = [UpdateOne({"_id": device_id, "timestamp": {"$lt": doc["timestamp"]}}, {"$set": _reading(doc)}, upsert=True)
+           for device_id, doc in newest.items()]
+    if not ops:
+        return
+    try:
+        await db.device_latest.bulk_write(ops, ordered=False)
+    except BulkWriteError as e:
+        if any(err.get("code") != 11000 for err in e.details.get("writeErrors", [])):
+            raise
+
+# Latest reading for each device id, from memory when fresh
+async def get_latest(device_ids: list) -> dict:
+    found, missing = {}, []
+    for device_id in device_ids:
+        doc = latest_readings.get(device_id)
+        if doc is not None:
+            found[device_id] = _reading(doc)
+        else:
+            missing.append(device_id)
+    if missing:
+        async for doc in dashboard_db.device_latest.find({"_id": {"$in": missing}}):
+            device_id = doc.pop("_id")
+            latest_readings.update({**doc, "device_id": device_id})
+            found[device_id] = doc
+    return found
+
+# Unordered bulk insert; returns the number written and the per-document
+# write errors as {"index": position in docs, "error": message}
+follow_up_failures = REGISTRY.counter("device_insert_follow_up_failures_total",
+                                      "Rollup, latest-reading or alert updates that failed after readings were stored",
+                                      ["step"])
+
+async def _follow_up(step: str, update):
+    try:
+        await update
+    except PyMongoError:
+        logger.exception("Updating %s for stored device readings failed", step)
+        follow_up_failures.inc(step=step)
+
+# Raises only when the readings themselves could not be written
+async def insert_readings(docs: list):
+    if not docs:
+        return 0, []
+    errors = []
+    try:
+        result = await db.device_data.insert_many(docs, ordered=False)
+        inserted = len(result.inserted_ids)
+    except BulkWriteError as e:
+        errors = [{"index": err["index"], "error": err.get("errmsg", "write failed")}
+                  for err in e.details.get("writeErrors", [])]
+        inserted = e.details.get("nInserted", 0)
+
+    failed = {err["index"] for err in errors}
+    written = [doc for i, doc in enumerate(docs) if i not in failed]
+    # a device this worker has not seen may be new to the device list too
+    new_devices = any(doc["device_id"] not in latest_readings.readings for doc in written)
+    # The readings are stored at this point, so nothing below may raise: a
+    # caller retrying the batch would insert them again and count them twice
+    # in the rollups. A failed step is logged and counted instead.
+    await _follow_up("rollups", update_rollups(written))
+    await _follow_up("latest", update_latest(written))
+    events = alert_engine.evaluate_many(written)
+    if events:
+        await _follow_up("alerts", record_alerts(events))
+    if not USE_CHANGE_STREAM:
+        device_hub.publish_many(written)
+    if written:
+        cache.invalidate("device_data", *(["devices"] if new_devices else []))
+    return inserted, errors
+
+def _rollup_row(doc: dict) -> dict:
+    row = {"device_id": doc["device_id"], "bucket": doc.get("bucket"), "count": doc["count"]}
+    for metric in ROLLUP_METRICS:
+        row[metric] = {
+            "min": doc[f"{metric}_min"],
+            "max": doc[f"{metric}_max"],
+            "avg": doc[f"{metric}_sum"] / doc["count"] if doc["count"] else None,
+        }
+    return row
+
+# Hourly buckets once the window is longer than this, minute buckets below it
+HOURLY_ROLLUP_AFTER = timedelta(hours=6)
+
+def pick_granularity(since: datetime, until: datetime) -> str:
+    return "hour" if until - since > HOURLY_ROLLUP_AFTER else "minute"
+
+def _window_filter(granularity: str, since: datetime, until: datetime, device_id=None) -> dict:
+    size = ROLLUP_GRANULARITIES[granularity]
+    query_filter = {"granularity": granularity, "bucket": {"$gte": bucket_start(since, size), "$lt": until}}
+    if device_id:
+        query_filter["device_id"] = device_id
+    return query_filter
+
+# Per-bucket rollups for one device (or all devices) over [since, until)
+async def get_rollups(since: datetime, until: datetime, device_id=None, granularity=None) -> list:
+    granularity = granularity or pick_granularity(since, until)
+    cursor = dashboard_db.device_rollups.find(_window_filter(granularity, since, until, device_id), {"_id": 0})
+    return [_rollup_row(doc) async for doc in cursor.sort([("bucket", 1), ("device_id", 1)])]
+
+# One row per device summarizing the whole window from the rollup buckets
+async def get_device_summaries(since: datetime, until: datetime, device_id=None) -> list:
+    group = {"_id": "$device_id", "count": {"$sum": "$count"}}
+    for metric in ROLLUP_METRICS:
+        group[f"{metric}_sum"] = {"$sum": f"${metric}_sum"}
+        group[f"{metric}_min"] = {"$min": f"${metric}_min"}
+        group[f"{metric}_max"] = {"$max": f"${metric}_max"}
+    pipeline = [
+        {"$match": _window_filter(pick_granularity(since, until), since, until, device_id)},
+        {"$group": group},
+        {"$sort": {"_id": 1}},
+        {"$addFields": {"device_id": "$_id"}},
+    ]
+    return [_rollup_row(doc) async for doc in dashboard_db.device_rollups.aggregate(pipeline)]
+
+async def _distinct_device_ids() -> list:
+    return await dashboard_db.device_rollups.distinct("device_id", {"granularity": "hour"})
+
+# Rarely changes: cached until a reading from an unseen device arrives
+async def list_device_ids() -> list:
+    return await cache.get_or_set("device_ids", None, _distinct_device_ids, tags=("devices",), ttl=DEVICE_LIST_TTL)
+
+async def _flush_readings(docs: list):
+    await insert_readings(docs)
+
+ingest_buffer = IngestBuffer(
+    _flush_readings,
+    max_size=int(os.getenv("DEVICE_INGEST_BUFFER_SIZE", 1000)),
+    max_delay=float(os.getenv("DEVICE_INGEST_FLUSH_SECONDS", 1.0)),
+)
+
+@REGISTRY.register_collector
+def _collect_ingest_buffer():
+    yield ("device_ingest_buffer_pending", "Device readings waiting in the ingest buffer", "gauge",
+           [({}, len(ingest_buffer.pending))])
+
+
+if __name__ == "__main__":
+    import argparse
+    import asyncio
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--backfill-rollups", action="store_true", required=True,
+                        help="rebuild device_rollups from device_data, replacing existing buckets")
+    parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    started = time.perf_counter()
+    if not asyncio.run(backfill_rollups()):
+        raise SystemExit("device rollups not rebuilt: no readings, or the aggregation failed (see above)")
+    print(f"rebuilt device rollups in {time.perf_counter() - started:.1f}s")
@@ -0,0 +1,121 @@
+# app/db/indexes.py
+import logging
+import os
+from datetime import datetime, timezone
+from pymongo import ASCENDING, DESCENDING, TEXT, IndexModel
+from pymongo.errors import PyMongoError
+from app.db.mongodb import db
+from app.db.device_store import USE_TIMESERIES, READINGS_SORT
+
+logger = logging.getLogger(__name__)
+
+# Dev mode: explain the hot queries at startup and refuse to start if any plan scans a whole collection
+QUERY_PLAN_AUDIT = os.getenv("QUERY_PLAN_AUDIT", "false").lower() in ("1", "true", "yes")
+
+INDEXES = {
+    "users": [
+        IndexModel([("username", ASCENDING)], unique=True, name="username_unique"),
+    ],
+    # newest-first keyset pages, with and without a device filter (see READINGS_SORT)
+    "device_data": [
+        IndexModel([("device_id", ASCENDING), ("timestamp", DESCENDING)], name="device_timestamp"),
+        IndexModel([("timestamp", DESCENDING)], name="timestamp"),
+    ] if USE_TIMESERIES else [
+        IndexModel([("device_id", ASCENDING), ("timestamp", DESCENDING), ("_id", DESCENDING)],
+                   name="device_timestamp_id"),
+        IndexModel([("timestamp", DESCENDING), ("_id", DESCENDING)], name="timestamp_id"),
+    ],
+    "device_rollups": [
+        IndexModel([("device_id", ASCENDING), ("granularity", ASCENDING), ("bucket", ASCENDING)],
+                   unique=True, name="device_granularity_bucket"),
+        IndexModel([("granularity", ASCENDING), ("bucket", ASCENDING)], name="granularity_bucket"),
+    ],
+    "alerts": [
+        IndexModel([("status", ASCENDING), ("opened_at", DESCENDING)], name="status_opened"),
+        IndexModel([("device_id", ASCENDING), ("opened_at", DESCENDING)], name="device_opened"),
+        # every process evaluates alerts; at most one open alert per rule and device
+        IndexModel([("rule_id", ASCENDING), ("device_id", ASCENDING)], unique=True, name="open_rule_device_unique",
+                   partialFilterExpression={"status": "open"}),
+    ],
+    "shipments": [
+        # imports upsert on shipmentNumber; unique so concurrent imports can't duplicate a shipment
+        IndexModel([("shipmentNumber", ASCENDING)], unique=True, name="shipment_number_unique"),
+        IndexModel([("createdBy", ASCENDING)], name="created_by"),
+        # listing: sort keys with the _id tiebreaker, filters, description search
+        IndexModel([("expectedDeliveryDate", ASCENDING), ("_id", ASCENDING)], name="delivery_date_id"),
+        IndexModel([("shipmentNumber", ASCENDING), ("_id", ASCENDING)], name="shipment_number_id"),
+        IndexModel([("goodsType", ASCENDING), ("expectedDeliveryDate", ASCENDING)], name="goods_type"),
+        IndexModel([("device", ASCENDING)], name="device"),
+        IndexModel([("deviceIds", ASCENDING)], name="device_ids"),
+        IndexModel([("shipmentDescription", ASCENDING)], name="description_prefix"),
+        IndexModel([("shipmentDescription", TEXT)], name="description_text"),
+    ],
+}
+
+# The filters and sorts the routes run on every request, by route
+_sample_time = datetime(2024, 1, 1, tzinfo=timezone.utc)
+HOT_QUERIES = [
+    ("auth/user_routes: user by username", "users", {"username": "audit"}, None),
+    ("device_routes: readings for a device", "device_data", {"device_id": "audit"}, READINGS_SORT),
+    ("device_routes: latest readings", "device_data", {}, READINGS_SORT),
+    ("device_routes: rollups for a device", "device_rollups",
+     {"device_id": "audit", "granularity": "hour", "bucket": {"$gte": _sample_time}}, [("bucket", ASCENDING)]),
+    ("device_routes: rollups for all devices", "device_rollups",
+     {"granularity": "hour", "bucket": {"$gte": _sample_time}}, [("bucket", ASCENDING)]),
+    ("device_routes: open alerts", "alerts", {"status": "open"}, [("opened_at", DESCENDING)]),
+    ("shipment_routes: shipment by number", "shipments", {"shipmentNumber": "audit"}, None),
+    ("shipment_routes: shipments by creator", "shipments", {"createdBy": "audit"}, None),
+    ("shipment_routes: listing by delivery date", "shipments", {},
+     [("expectedDeliveryDate", ASCENDING), ("_id", ASCENDING)]),
+    ("shipment_routes: listing by goods type", "shipments", {"goodsType": "audit"},
+     [("expectedDeliveryDate", ASCENDING), ("_id", ASCENDING)]),
+    ("shipment_routes: shipments linked to a device", "shipments", {"deviceIds": "audit"}, None),
+    ("shipment_routes: description prefix", "shipments", {"shipmentDescription": {"$regex": "^audit"}}, None),
+]
+
+# One index at a time, so one that can't be built doesn't hold up the others
+async def ensure_indexes():
+    for collection, indexes in INDEXES.items():
+        for index in indexes:
+            try:
+                await db[collection].create_indexes([index])
+            except PyMongoError:
+                # e.g. duplicate usernames already stored; keep serving but make it visible
+                logger.exception("Could not create index %s on %s", index.document["name"], collection)
+
+def _stages(plan: dict):
+    yield plan.get("stage")
+    for key in ("inputStage", "queryPlan"):
+        if isinstance(plan.get(key), dict):
+            yield from _stages(plan[key])
+    for child in plan.get("inputStages", []):
+        yield from _stages(child)
+
+def _winning_plan(explain: dict) -> dict:
+    planner = explain.get("queryPlanner", {})
+    if "winningPlan" not in planner:
+        # time-series queries are explained as a pipeline over the buckets collection
+        for stage in explain.get("stages", []):
+            if "$cursor" in stage:
+                planner = stage["$cursor"].get("queryPlanner", {})
+                break
+    return planner.get("winningPlan", {})
+
+# Returns [(query name, collection)] for every hot query whose plan has a COLLSCAN
+async def audit_query_plans() -> list:
+    offenders = []
+    for name, collection, query_filter, sort in HOT_QUERIES:
+        command = {"find": collection, "filter": query_filter}
+        if sort:
+            command["sort"] = dict(sort)
+        explain = await db.command("explain", command, verbosity="queryPlanner")
+        if "COLLSCAN" in set(_stages(_winning_plan(explain))):
+            offenders.append((name, collection))
+    return offenders
+
+async def bootstrap_indexes():
+    await ensure_indexes()
+    if QUERY_PLAN_AUDIT:
+        offenders = await audit_query_plans()
+        if offenders:
+            raise RuntimeError("Hot queries use COLLSCAN: " + "; ".join(f"{n} ({c})" for n, c in offenders))
@@ -1,12 +1,115 @@
 # app/db/mongodb.py
-import motor.motor_asyncio 
+import motor.motor_asyncio
+import logging
 import os
 from dotenv import load_dotenv
-from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import monitoring
+from pymongo.read_preferences import read_pref_mode_from_name, make_read_preference
+from app.utils.metrics import REGISTRY
+from app.utils.request_timing import add_time
 
 # Load environment variables from .env file
 load_dotenv()
+logger = logging.getLogger(__name__)
 
 MONGO_URI = os.getenv("MONGO_URI")
-client = motor.motor_asyncio.AsyncIOMotorClient(MONGO_URI)
-db = client["shipmentDB"]
\ No newline at end of file
+MONGO_DB = os.getenv("MONGO_DB", "shipmentDB")
+# Pool sizing and timeouts, per uvicorn worker
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", 100))
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", 0))
+MONGO_MAX_CONNECTING = int(os.getenv("MONGO_MAX_CONNECTING", 2))
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", 5000))
+MONGO_CONNECT_TIMEOUT_MS = int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", 5000))
+MONGO_SOCKET_TIMEOUT_MS = int(os.getenv("MONGO_SOCKET_TIMEOUT_MS", 20000))
+MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", 10000))
+# Read preference for dashboard/listing reads. Primary by default: those
+# pages are re-rendered right after a write (e.g. the redirect after creating
+# a shipment) and then cached, so a secondary that lags would have its stale
+# page served for the whole cache TTL. Set e.g. secondaryPreferred only if
+# that is acceptable.
+MONGO_DASHBOARD_READ_PREFERENCE = os.getenv("MONGO_DASHBOARD_READ_PREFERENCE", "primary")
+
+pool_checkout_seconds = REGISTRY.histogram(
+    "mongo_pool_checkout_seconds", "Time spent waiting to check a connection out of the pool", ["result"])
+pool_connections_in_use = REGISTRY.gauge(
+    "mongo_pool_connections_in_use", "Connections currently checked out", ["address"])
+pool_connections_open = REGISTRY.gauge(
+    "mongo_pool_connections_open", "Connections currently open", ["address"])
+command_seconds = REGISTRY.histogram(
+    "mongo_command_seconds", "Server round trip time per command", ["command", "status"])
+
+
+def _address(event) -> str:
+    host, port = event.address
+    return f"{host}:{port}"
+
+
+class PoolMetricsListener(monitoring.ConnectionPoolListener):
+    def pool_created(self, event): pass
+    def pool_ready(self, event): pass
+    def pool_cleared(self, event): pass
+    def pool_closed(self, event): pass
+    def connection_ready(self, event): pass
+    def connection_check_out_started(self, event): pass
+
+    def connection_created(self, event):
+        pool_connections_open.inc(address=_address(event))
+
+    def connection_closed(self, event):
+        pool_connections_open.dec(address=_address(event))
+
+    def connection_checked_out(self, event):
+        pool_checkout_seconds.observe(event.duration, result="ok")
+        pool_connections_in_use.inc(address=_address(event))
+
+    def connection_check_out_failed(self, event):
+        pool_checkout_seconds.observe(event.duration, result=event.reason)
+
+    def connection_checked_in(self, event):
+        pool_connections_in_use.dec(address=_address(event))
+
+
+class CommandMetricsListener(monitoring.CommandListener):
+    def started(self, event): pass
+
+    def succeeded(self, event):
+        command_seconds.observe(event.duration_micros / 1e6, command=event.command_name, status="ok")
+        add_time("db", event.duration_micros / 1e6)
+
+    def failed(self, event):
+        command_seconds.observe(event.duration_micros / 1e6, command=event.command_name, status="error")
+        add_time("db", event.duration_micros / 1e6)
+
+
+# Motor connects lazily, so the client can be built at import; the lifespan
+# calls connect() to fail fast and warm the pool, and close() on shutdown
+client = motor.motor_asyncio.AsyncIOMotorClient(
+    MONGO_URI,
+    maxPoolSize=MONGO_MAX_POOL_SIZE,
+    minPoolSize=MONGO_MIN_POOL_SIZE,
+    maxConnecting=MONGO_MAX_CONNECTING,
+    serverSelectionTimeoutMS=MONGO_SERVER_SELECTION_TIMEOUT_MS,
+    connectTimeoutMS=MONGO_CONNECT_TIMEOUT_MS,
+    socketTimeoutMS=MONGO_SOCKET_TIMEOUT_MS,
+    waitQueueTimeoutMS=MONGO_WAIT_QUEUE_TIMEOUT_MS,
+    event_listeners=[PoolMetricsListener(), CommandMetricsListener()],
+)
+db = client[MONGO_DB]
+
+# Same database, reading with the dashboard read preference (e.g. from secondaries)
+dashboard_db = db.with_options(read_preference=make_read_preference(
+    read_pref_mode_from_name(MONGO_DASHBOARD_READ_PREFERENCE), None))
+
+
+# Raises after MONGO_SERVER_SELECTION_TIMEOUT_MS when no server answers, so
+# a worker without a database stops at startup instead of failing requests
+async def connect():
+    try:
+        await client.admin.command("ping")
+    except Exception:
+        logger.error("MongoDB is not reachable at startup (%s)", MONGO_URI and MONGO_URI.split("@")[-1])
+        raise
+
+
+def close():
+    client.close()
@@ -0,0 +1,122 @@
+# app/db/shipment_store.py
+import re
+from datetime import datetime, timedelta, timezone
+from pymongo import ASCENDING, DESCENDING, UpdateOne
+from app.db.mongodb import db, dashboard_db
+from app.db.device_store import ROLLUP_METRICS, bucket_start
+from app.utils.pagination import encode_cursor, decode_cursor, keyset_filter
+
+SORT_FIELDS = ("expectedDeliveryDate", "shipmentNumber")
+FILTER_FIELDS = ("goodsType", "device", "createdBy")
+# Only the columns the shipment table shows
+LIST_PROJECTION = {
+    "shipmentNumber": 1, "routeDetails": 1, "device": 1, "goodsType": 1,
+    "expectedDeliveryDate": 1, "createdBy": 1,
+}
+
+# Shipment.device is free text ("DEV01", "DEV01, DEV02", "DEV01 / DEV02");
+# deviceIds is the list of device_id values it names, stored on the shipment
+# so readings can be joined without parsing it at query time
+def device_ids(device: str) -> list:
+    ids = []
+    for part in re.split(r"[,;/|\s]+", device or ""):
+        if part and part not in ids:
+            ids.append(part)
+    return ids
+
+# Shipment fields to store for a validated Shipment
+def shipment_document(shipment) -> dict:
+    data = shipment.model_dump()
+    data["deviceIds"] = device_ids(data["device"])
+    return data
+
+# Sets deviceIds on shipments stored before the link existed
+async def backfill_device_links(batch_size: int = 1000) -> int:
+    updated, ops = 0, []
+    async for doc in db.shipments.find({"deviceIds": {"$exists": False}}, {"device": 1}):
+        ops.append(UpdateOne({"_id": doc["_id"]}, {"$set": {"deviceIds": device_ids(doc.get("device"))}}))
+        if len(ops) >= batch_size:
+            updated += (await db.shipments.bulk_write(ops, ordered=False)).modified_count
+            ops = []
+    if ops:
+        updated += (await db.shipments.bulk_write(ops, ordered=False)).modified_count
+    return updated
+
+def _listing_filter(sort: str, descending: bool, after: str, filters: dict, prefix: str, q: str) -> dict:
+    clauses = [{field: value} for field, value in (filters or {}).items() if value]
+    if prefix:
+        clauses.append({"shipmentDescription": {"$regex": "^" + re.escape(prefix)}})
+    if q:
+        clauses.append({"$text": {"$search": q}})
+    if after:
+        last_value, last_id = decode_cursor(after)
+        clauses.append(keyset_filter(sort, last_value, last_id, descending))
+    return {"$and": clauses} if clauses else {}
+
+# One page of shipments, keyset-paginated on (sort, _id). `prefix` matches
+# the start of shipmentDescription (index-backed), `q` is a full-text search
+# over it. Returns (rows, cursor for the next page or None).
+async def list_shipments(sort: str = "expectedDeliveryDate", descending: bool = False, limit: int = 50,
+                         after: str = None, filters: dict = None, prefix: str = None, q: str = None):
+    query_filter = _listing_filter(sort, descending, after, filters, prefix, q)
+    direction = DESCENDING if descending else ASCENDING
+    cursor = dashboard_db.shipments.find(query_filter, LIST_PROJECTION).sort([(sort, direction), ("_id", direction)])
+    rows = await cursor.limit(limit).to_list(limit)
+    next_cursor = None
+    if len(rows) == limit:
+        next_cursor = encode_cursor(rows[-1].get(sort), rows[-1]["_id"])
+    return rows, next_cursor
+
+def _condition_summary(summary: dict):
+    if not summary or not summary.get("count"):
+        return None
+    row = {"count": summary["count"]}
+    for metric in ROLLUP_METRICS:
+        row[metric] = {
+            "min": summary[f"{metric}_min"],
+            "max": summary[f"{metric}_max"],
+            "avg": summary[f"{metric}_sum"] / summary["count"],
+        }
+    return row
+
+# One page of the shipment listing with, per shipment, the latest reading of
+# each linked device and a temperature/battery summary over the last `hours`
+# from the hourly rollups. Both come from $lookup stages of one aggregation.
+async def list_shipment_conditions(sort: str = "expectedDeliveryDate", descending: bool = False, limit: int = 50,
+                                   after: str = None, filters: dict = None, prefix: str = None, q: str = None,
+                                   hours: int = 24):
+    since = bucket_start(datetime.now(timezone.utc) - timedelta(hours=hours), 3600)
+    summary = {"_id": None, "count": {"$sum": "$count"}}
+    for metric in ROLLUP_METRICS:
+        summary[f"{metric}_sum"] = {"$sum": f"${metric}_sum"}
+        summary[f"{metric}_min"] = {"$min": f"${metric}_min"}
+        summary[f"{metric}_max"] = {"$max": f"${metric}_max"}
+    direction = -1 if descending else 1
+    pipeline = [
+        {"$match": _listing_filter(sort, descending, after, filters, prefix, q)},
+        {"$sort": {sort: direction, "_id": direction}},
+        {"$limit": limit},
+        {"$project": {**LIST_PROJECTION, "deviceIds": 1}},
+        {"$lookup": {"from": "device_latest", "localField": "deviceIds", "foreignField": "_id", "as": "latest"}},
+        # equality on deviceIds plus the pipeline's match is a seek on
+        # device_granularity_bucket per linked device (MongoDB 5.0+)
+        {"$lookup": {
+            "from": "device_rollups",
+            "localField": "deviceIds",
+            "foreignField": "device_id",
+            "pipeline": [
+                {"$match": {"granularity": "hour", "bucket": {"$gte": since}}},
+                {"$group": summary},
+            ],
+            "as": "summary",
+        }},
+    ]
+    rows = []
+    async for doc in dashboard_db.shipments.aggregate(pipeline):
+        doc["latest"] = {reading.pop("_id"): reading for reading in doc["latest"]}
+        doc["summary"] = _condition_summary(doc["summary"][0] if doc["summary"] else None)
+        rows.append(doc)
+    next_cursor = None
+    if len(rows) == limit:
+        next_cursor = encode_cursor(rows[-1].get(sort), rows[-1]["_id"])
+    return rows, next_cursor
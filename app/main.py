@@ -4,10 +4,57 @@ from fastapi import FastAPI, HTTPException, Request
 from fastapi.staticfiles import StaticFiles
 from app.routes import auth_routes, shipment_routes, device_routes, user_routes
 from fastapi.responses import RedirectResponse
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
+from contextlib import asynccontextmanager
+from app.db.device_store import ingest_buffer, ensure_device_storage, check_rollups, USE_CHANGE_STREAM
+from app.db.mongodb import db, connect as connect_mongo, close as close_mongo
+from app.utils.metrics import REGISTRY
+from app.db.indexes import bootstrap_indexes
+from app.db.shipment_store import backfill_device_links
+from app.db.alert_store import load_alert_engine, refresh_alert_config
+from app.utils.device_hub import device_hub
+from app.consumers.device_consumer import DeviceConsumer, create_kafka_consumer, KAFKA_EMBEDDED_CONSUMER
+from app.utils.passwords import password_pool
+from app.utils.recaptcha import recaptcha_verifier
+from app.templates import precompile_templates
+from app.utils.request_timing import RequestTimingMiddleware, loop_monitor
+from app.utils.serialization import ORJSONResponse
+import asyncio
 
-app = FastAPI(title="SCMXpertLite API",description="API for SCM")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    precompile_templates()
+    loop_monitor.start()
+    await connect_mongo()
+    await ensure_device_storage()
+    await bootstrap_indexes()
+    await backfill_device_links()
+    await check_rollups()
+    await load_alert_engine()
+    alert_refresher = asyncio.create_task(refresh_alert_config())
+    await recaptcha_verifier.start()
+    ingest_buffer.start()
+    watcher = asyncio.create_task(device_hub.watch(db.device_data)) if USE_CHANGE_STREAM else None
+    device_consumer = DeviceConsumer(create_kafka_consumer()) if KAFKA_EMBEDDED_CONSUMER else None
+    if device_consumer:
+        device_consumer.start()
+    app.state.device_consumer = device_consumer
+    yield
+    if device_consumer:
+        await device_consumer.stop()
+    if watcher:
+        watcher.cancel()
+    alert_refresher.cancel()
+    # flush buffered device readings before the worker exits
+    await ingest_buffer.stop()
+    password_pool.shutdown()
+    await recaptcha_verifier.close()
+    close_mongo()
+    loop_monitor.stop()
+
+app = FastAPI(title="SCMXpertLite API",description="API for SCM", lifespan=lifespan,
+              default_response_class=ORJSONResponse)
 
 @app.exception_handler(HTTPException)
 async def http_exception_handler(request: Request, exc: HTTPException):
@@ -24,8 +71,15 @@ app.include_router(user_routes.router, tags=["Users & Dashboards"])
 
 app.mount("/static", StaticFiles(directory="app/static"), name="static")
 
+# Prometheus scrape endpoint: pool usage, command latency and component stats
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
 @app.get("/", include_in_schema=False)
 async def root():
     return RedirectResponse(url="/auth/login")
 
+# per-route latency split by phase, exported at /metrics
+app.add_middleware(RequestTimingMiddleware)
 app.add_middleware(CORSMiddleware,allow_origins=["*"],allow_credentials=True,allow_methods=["*"],allow_headers=["*"],)
@@ -0,0 +1,29 @@
+# app/models/alert_models.py
+from pydantic import BaseModel, Field, model_validator
+from typing import Literal, Optional
+
+# A threshold on one metric, for one device, for every device carrying a
+# goodsType, or (neither set) for all devices. With window_minutes the rule
+# compares the average over that trailing window instead of each reading.
+# An alert opens when the value crosses `threshold` and only resolves once
+# it is back past `clear_threshold`, so a value hovering at the limit does
+# not flap.
+class AlertRule(BaseModel):
+    name: str
+    metric: Literal["sensor_temperature", "battery_level"]
+    op: Literal["above", "below"]
+    threshold: float
+    clear_threshold: Optional[float] = None
+    window_minutes: float = Field(0, ge=0, le=24 * 60)
+    device_id: Optional[str] = None
+    goodsType: Optional[str] = None
+
+    @model_validator(mode="after")
+    def check_scope_and_hysteresis(self):
+        if self.device_id and self.goodsType:
+            raise ValueError("A rule applies to a device_id or a goodsType, not both")
+        if self.clear_threshold is None:
+            self.clear_threshold = self.threshold
+        elif (self.clear_threshold > self.threshold) if self.op == "above" else (self.clear_threshold < self.threshold):
+            raise ValueError("clear_threshold must be on the safe side of threshold")
+        return self
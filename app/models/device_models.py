@@ -1,5 +1,5 @@
 # app/models/device_models.py
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from datetime import datetime
 
 class DeviceData(BaseModel):
@@ -9,3 +9,8 @@ class DeviceData(BaseModel):
     route_from: str
     route_to: str
     timestamp: datetime
+
+# A stored reading as the read API returns it (documents the response; the
+# route sends the projection as read, without revalidating it)
+class DeviceReading(DeviceData):
+    id: str = Field(alias="_id")
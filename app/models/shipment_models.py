@@ -1,5 +1,6 @@
 # app/models/shipment_models.py
 from pydantic import BaseModel
+from typing import Optional
 
 class Shipment(BaseModel):
     shipmentNumber: str
@@ -14,3 +15,13 @@ class Shipment(BaseModel):
     deliveryNumber: str
     batchNumber: str
     shipmentDescription: str
+
+# Row of the shipment listing: the columns the table shows
+class ShipmentSummary(BaseModel):
+    id: str
+    shipmentNumber: str
+    routeDetails: str
+    device: str
+    goodsType: str
+    expectedDeliveryDate: str
+    createdBy: Optional[str] = None
@@ -2,19 +2,19 @@
 from fastapi import APIRouter, HTTPException, Depends, Response, Request, Form
 from fastapi.security import OAuth2PasswordRequestForm
 from fastapi.responses import HTMLResponse, RedirectResponse
-from passlib.context import CryptContext
+from app.templates import templates
 from app.db.mongodb import db
-from app.utils.auth import create_access_token
+from app.utils.auth import create_access_token, revoke_token
 from app.utils.rbac import get_current_user
-from fastapi.templating import Jinja2Templates
+from app.utils.passwords import hash_password, verify_password
+from app.utils.cache import cache
+from app.utils.request_timing import timed
+from app.utils.recaptcha import recaptcha_verifier, RecaptchaUnavailable
 import os
-import httpx
 import re 
 
 
 router = APIRouter()
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-templates = Jinja2Templates(directory="app/templates")
 
 
 @router.get("/login", response_class=HTMLResponse)
@@ -23,34 +23,56 @@ async def login_page(request: Request, msg: str = ""):
     return templates.TemplateResponse("login.html", {"request": request, "msg": msg, "recaptcha_site_key": site_key})
 
 
+# Claims carried in the token so pages don't have to look the user up again
+def _token_claims(db_user: dict) -> dict:
+    return {
+        "sub": db_user["username"],
+        "role": db_user["role"],
+        "email": db_user.get("email"),
+        "ver": db_user.get("token_version", 0),
+    }
+
+# Checks the password off the event loop and upgrades the stored hash
+# when the CryptContext policy asks for it
+async def _authenticate(username: str, password: str):
+    with timed("auth"):
+        db_user = await db.users.find_one({"username": username})
+        if not db_user:
+            return None
+        valid, new_hash = await verify_password(password, db_user["password"])
+        if not valid:
+            return None
+        if new_hash:
+            await db.users.update_one({"_id": db_user["_id"]}, {"$set": {"password": new_hash}})
+        return db_user
+
 # Login handler (POST) for frontend forms
 @router.post("/login", response_class=HTMLResponse)
 async def login(request: Request, response: Response, username: str = Form(...), password: str = Form(...), g_recaptcha_response: str = Form(alias="g-recaptcha-response")):
     secret_key = os.getenv("RECAPTCHA_SECRET_KEY")
-    async with httpx.AsyncClient() as client:
-        verify = await client.post(
-            "https://www.google.com/recaptcha/api/siteverify",
-            data={
-                "secret": secret_key,
-                "response": g_recaptcha_response
-            }
-        )
-        result = verify.json()
-        if not result.get("success"):
-            return templates.TemplateResponse("login.html", {
-                "request": request,
-                "msg": "Captcha verification failed.",
-                "recaptcha_site_key": os.getenv("RECAPTCHA_SITE_KEY")
-            }, status_code=400)
-    db_user = await db.users.find_one({"username": username})
-    if not db_user or not pwd_context.verify(password, db_user["password"]):
+    try:
+        captcha_ok = await recaptcha_verifier.verify(secret_key, g_recaptcha_response, username)
+    except RecaptchaUnavailable:
+        return templates.TemplateResponse("login.html", {
+            "request": request,
+            "msg": "Captcha service is unavailable, please try again shortly.",
+            "recaptcha_site_key": os.getenv("RECAPTCHA_SITE_KEY")
+        }, status_code=503)
+    if not captcha_ok:
+        return templates.TemplateResponse("login.html", {
+            "request": request,
+            "msg": "Captcha verification failed.",
+            "recaptcha_site_key": os.getenv("RECAPTCHA_SITE_KEY")
+        }, status_code=400)
+    db_user = await _authenticate(username, password)
+    if not db_user:
         return templates.TemplateResponse("login.html", {
         "request": request,
         "msg": "Invalid username or password",
         "recaptcha_site_key": os.getenv("RECAPTCHA_SITE_KEY")
     }, status_code=401)
 
-    token = create_access_token({"sub": db_user["username"], "role": db_user["role"]})
+    token = create_access_token(_token_claims(db_user))
     response = RedirectResponse(url="/admin/dashboard" if db_user["role"] == "admin" else "/user/dashboard", status_code=303)
     response.set_cookie(key="access_token", value=token, httponly=True, max_age=1800, samesite="lax", secure=False)
     return response
@@ -91,13 +113,17 @@ async def signup(
     password_error = validate_password(password)
     if password_error:
         return templates.TemplateResponse("signup.html", {"request": request,"error": password_error})
-    hashed_pw = pwd_context.hash(password)
+    hashed_pw = await hash_password(password)
     await db.users.insert_one({"username": username, "email": email, "password": hashed_pw, "role": "user"})
+    cache.invalidate("users")
     return RedirectResponse(url="/auth/login?msg=Account created successfully. Please login.", status_code=303)
 
 # Logout handler
 @router.get("/logout")
-async def logout():
+async def logout(request: Request):
+    token = request.cookies.get("access_token")
+    if token:
+        revoke_token(token)
     response = RedirectResponse(url="/auth/login", status_code=303)
     response.delete_cookie("access_token")
     return response
@@ -110,8 +136,8 @@ async def get_current_user_profile(user: dict = Depends(get_current_user)):
 # API endpoint to get a token 
 @router.post("/token")
 async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends()):
-    db_user = await db.users.find_one({"username": form_data.username})
-    if not db_user or not pwd_context.verify(form_data.password, db_user["password"]):
+    db_user = await _authenticate(form_data.username, form_data.password)
+    if not db_user:
         raise HTTPException(status_code=401, detail="Invalid credentials")
-    token = create_access_token({"sub": db_user["username"], "role": db_user["role"]})
+    token = create_access_token(_token_claims(db_user))
     return {"access_token": token, "token_type": "bearer"}
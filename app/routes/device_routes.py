@@ -1,68 +1,287 @@
 # app/routes/device_routes.py
-from fastapi import APIRouter, Depends, Request, Query
-from fastapi.responses import HTMLResponse
-from fastapi.templating import Jinja2Templates
-from app.models.device_models import DeviceData
-from app.utils.rbac import is_admin
+from fastapi import APIRouter, Depends, Request, Query, Response, HTTPException
+from fastapi.responses import HTMLResponse, StreamingResponse
+from app.templates import stream_template
+from app.models.device_models import DeviceData, DeviceReading
+from app.models.alert_models import AlertRule
+from app.utils.rbac import is_admin, websocket_admin
 from app.db.mongodb import db
+from app.utils.device_hub import device_hub
+from app.utils.cache import cache
+from app.utils.serialization import ORJSONResponse, dumps_str
+from app.db.alert_store import alert_hub, create_rule, delete_rule, list_rules, list_alerts
+from app.db.device_store import (insert_readings, ingest_buffer, get_rollups, get_device_summaries, list_device_ids,
+                                 get_latest, READINGS_SORT, readings_after_filter, next_readings_cursor)
+from pydantic import ValidationError
+from bson import ObjectId
 from fastapi import WebSocket, WebSocketDisconnect
+from datetime import datetime, timedelta, timezone
 import asyncio
-from typing import Optional
+import orjson
+from typing import List, Optional
+
+# Documents pulled from the server per round trip when streaming
+STREAM_BATCH_SIZE = 500
+# Largest number of readings accepted in one batch request
+MAX_INGEST_BATCH = 10000
+# Raw readings shown under the rollup summary on the device data page
+RAW_PAGE_ROWS = 200
 
 
 router = APIRouter()
-templates = Jinja2Templates(directory="app/templates")
 
 @router.post("/device-data")
 async def add_device_data_api(data: DeviceData, user=Depends(is_admin)):
-    await db.device_data.insert_one(data.dict())
+    inserted, errors = await insert_readings([data.model_dump()])
+    if errors:
+        raise HTTPException(status_code=500, detail=errors[0]["error"])
     return {"msg": "Device data added successfully"}
 
-@router.get("/device-data")
-async def get_all_device_data_api(
-    user=Depends(is_admin), 
-    device_id: Optional[str] = Query(None)
+# Stands in for an NDJSON line that isn't JSON (a line may well be "null")
+_UNPARSEABLE = object()
+
+# Returns (items, errors). An NDJSON line that isn't JSON is reported by its
+# position, like a reading that fails validation.
+def _parse_batch(body: bytes, content_type: str):
+    if "ndjson" in content_type:
+        items, errors = [], []
+        for line in body.splitlines():
+            if not line.strip():
+                continue
+            try:
+                items.append(orjson.loads(line))
+            except ValueError as e:
+                errors.append({"index": len(items), "error": f"Invalid JSON: {e}"})
+                items.append(_UNPARSEABLE)
+        return items, errors
+    try:
+        items = orjson.loads(body)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Body must be a JSON array or NDJSON")
+    if not isinstance(items, list):
+        raise HTTPException(status_code=400, detail="Body must be a JSON array or NDJSON")
+    return items, []
+
+# Batch ingest: a JSON array or an application/x-ndjson body of DeviceData.
+# Valid readings are written with one unordered insert_many; invalid ones are
+# reported by their position in the batch. With buffered=true the readings are
+# queued in memory and flushed on size or time (202, write errors not reported).
+@router.post("/device-data/batch")
+async def add_device_data_batch_api(
+    request: Request,
+    response: Response,
+    user=Depends(is_admin),
+    buffered: bool = Query(False)
 ):
-    # Build query filter
+    items, errors = _parse_batch(await request.body(), request.headers.get("content-type", ""))
+    if len(items) > MAX_INGEST_BATCH:
+        raise HTTPException(status_code=413, detail=f"Batch larger than {MAX_INGEST_BATCH} readings")
+
+    docs, positions = [], []
+    for index, item in enumerate(items):
+        if item is _UNPARSEABLE:
+            continue
+        try:
+            docs.append(DeviceData.model_validate(item).model_dump())
+            positions.append(index)
+        except ValidationError as e:
+            errors.append({"index": index, "error": e.errors(include_url=False, include_context=False)})
+
+    if buffered:
+        await ingest_buffer.add(docs)
+        response.status_code = 202
+        errors.sort(key=lambda err: err["index"])
+        return {"received": len(items), "queued": len(docs), "errors": errors}
+
+    inserted, write_errors = await insert_readings(docs)
+    errors += [{"index": positions[err["index"]], "error": err["error"]} for err in write_errors]
+    errors.sort(key=lambda err: err["index"])
+    return {"received": len(items), "inserted": inserted, "errors": errors}
+
+def _device_filter(device_id: Optional[str], since: Optional[datetime], until: Optional[datetime]) -> dict:
     query_filter = {}
     if device_id:
         query_filter["device_id"] = device_id
-    
-    data = await db.device_data.find(query_filter).to_list(None)
-    for item in data:
-        item["_id"] = str(item["_id"])
-    return data
+    if since or until:
+        query_filter["timestamp"] = {}
+        if since:
+            query_filter["timestamp"]["$gte"] = since
+        if until:
+            query_filter["timestamp"]["$lt"] = until
+    return query_filter
+
+# Sends NDJSON straight from the cursor, one chunk per server batch
+async def _stream_ndjson(cursor):
+    lines = []
+    async for item in cursor:
+        lines.append(dumps_str(item))
+        if len(lines) >= STREAM_BATCH_SIZE:
+            yield "\n".join(lines) + "\n"
+            lines = []
+    if lines:
+        yield "\n".join(lines) + "\n"
+
+# Newest first, keyset-paginated (see readings_after_filter). The cursor for the next
+# page is returned in the X-Next-Cursor header; format=ndjson streams every
+# matching reading after the cursor instead of a single page.
+@router.get("/device-data", response_model=List[DeviceReading])
+async def get_all_device_data_api(
+    user=Depends(is_admin),
+    device_id: Optional[str] = Query(None),
+    since: Optional[datetime] = Query(None, description="Only readings at or after this time"),
+    until: Optional[datetime] = Query(None, description="Only readings before this time"),
+    after: Optional[str] = Query(None, description="Cursor from the X-Next-Cursor header of the previous page"),
+    limit: int = Query(100, ge=1, le=1000),
+    format: str = Query("json", pattern="^(json|ndjson)$")
+):
+    # Build query filter
+    query_filter = _device_filter(device_id, since, until)
+    if after:
+        query_filter = {"$and": [query_filter, readings_after_filter(after)]}
+
+    cursor = db.device_data.find(query_filter).sort(READINGS_SORT)
+
+    if format == "ndjson":
+        return StreamingResponse(_stream_ndjson(cursor.batch_size(STREAM_BATCH_SIZE)), media_type="application/x-ndjson")
+
+    # stored readings are returned as read: ObjectId and datetime are encoded by the response class
+    data = await cursor.limit(limit).to_list(limit)
+    headers = {}
+    if len(data) == limit:
+        headers["X-Next-Cursor"] = next_readings_cursor(data, after)
+    return ORJSONResponse(data, headers=headers)
+
+# Min/max/avg temperature and battery per bucket from the pre-aggregated
+# rollups; granularity defaults to hourly for windows longer than 6 hours
+@router.get("/device-data/rollups")
+async def get_device_rollups_api(
+    user=Depends(is_admin),
+    device_id: Optional[str] = Query(None),
+    since: Optional[datetime] = Query(None, description="Defaults to 24 hours before until"),
+    until: Optional[datetime] = Query(None, description="Defaults to now"),
+    granularity: Optional[str] = Query(None, pattern="^(minute|hour)$")
+):
+    until = until or datetime.now(timezone.utc)
+    since = since or until - timedelta(hours=24)
+    return await get_rollups(since, until, device_id, granularity)
+
+# Latest reading of one device, answered from memory when this worker saw it recently
+@router.get("/latest/{device_id}")
+async def get_latest_reading_api(device_id: str, user=Depends(is_admin)):
+    latest = await get_latest([device_id])
+    if device_id not in latest:
+        raise HTTPException(status_code=404, detail="No readings for this device")
+    return {"device_id": device_id, **latest[device_id]}
+
+# Threshold rules evaluated against every ingested reading
+@router.get("/alert-rules")
+async def list_alert_rules_api(user=Depends(is_admin)):
+    return await list_rules()
+
+@router.post("/alert-rules", status_code=201)
+async def create_alert_rule_api(rule: AlertRule, user=Depends(is_admin)):
+    return {"id": await create_rule(rule.model_dump())}
+
+@router.delete("/alert-rules/{rule_id}")
+async def delete_alert_rule_api(rule_id: str, user=Depends(is_admin)):
+    if not ObjectId.is_valid(rule_id) or not await delete_rule(rule_id):
+        raise HTTPException(status_code=404, detail="Rule not found")
+    return {"msg": "Rule deleted"}
+
+@router.get("/alerts")
+async def list_alerts_api(
+    user=Depends(is_admin),
+    status: Optional[str] = Query(None, pattern="^(open|resolved)$"),
+    device_id: Optional[str] = Query(None),
+    limit: int = Query(100, ge=1, le=1000)
+):
+    return await list_alerts(status, device_id, limit)
 
 @router.get("/device-data-page", response_class=HTMLResponse)
 async def view_device_data_page(
     request: Request, 
     user=Depends(is_admin),
-    device_id: Optional[str] = Query(None)
+    device_id: Optional[str] = Query(None),
+    hours: int = Query(24, ge=1, le=24 * 90)
 ):
-    # Build query filter
-    query_filter = {}
-    if device_id:
-        query_filter["device_id"] = device_id
-    
-    data = await db.device_data.find(query_filter).to_list(None)
-    
-    # Get unique device IDs for filter dropdown
-    all_devices = await db.device_data.distinct("device_id")
-    
-    return templates.TemplateResponse("device_data.html", {
-        "request": request, 
-        "device_data": data,
-        "all_devices": all_devices,
-        "selected_device": device_id
-    })
+    async def render():
+        until = datetime.now(timezone.utc)
+        since = until - timedelta(hours=hours)
+
+        # Window summary comes from the rollups; only the latest raw rows are read
+        summaries = await get_device_summaries(since, until, device_id)
+        query_filter = _device_filter(device_id, None, None)
+        data = await db.device_data.find(query_filter).sort(READINGS_SORT).to_list(RAW_PAGE_ROWS)
+
+        # Get unique device IDs for filter dropdown
+        all_devices = await list_device_ids()
 
+        return stream_template("device_data.html", {
+            "request": request,
+            "device_data": data,
+            "summaries": summaries,
+            "hours": hours,
+            "all_devices": all_devices,
+            "selected_device": device_id
+        })
+
+    # re-rendered after the next ingest
+    return await cache.page(request, "device_data_page", render, tags=("device_data", "devices"))
+
+async def _pump(websocket: WebSocket, subscriber):
+    try:
+        while True:
+            for message in await subscriber.next_batch():
+                await websocket.send_text(message)
+    except (WebSocketDisconnect, RuntimeError, OSError):
+        # the client went away mid-send; the receive loop notices and cleans up
+        pass
+
+# Live readings from the in-process hub, optionally filtered by device_id
+# (repeatable); admins only, like the rest of the device API. Each socket has
+# its own bounded queue so a slow client drops or coalesces its own messages
+# without holding up the others.
 @router.websocket("/ws/device-stream")
-async def device_data_stream(websocket: WebSocket):
+async def device_data_stream(
+    websocket: WebSocket,
+    device_id: Optional[List[str]] = Query(None),
+    policy: str = Query("drop", pattern="^(drop|coalesce)$"),
+    queue_size: int = Query(100, ge=1, le=1000)
+):
+    if await websocket_admin(websocket) is None:
+        await websocket.close(code=1008)  # policy violation
+        return
+    await websocket.accept()
+    subscriber = device_hub.subscribe(device_id, queue_size, policy)
+    sender = asyncio.create_task(_pump(websocket, subscriber))
+    try:
+        # clients don't send anything; receiving is how a disconnect is noticed
+        while True:
+            await websocket.receive_text()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        sender.cancel()
+        device_hub.unsubscribe(subscriber)
+
+# Alerts as they open and resolve, optionally filtered by device_id; admins only
+@router.websocket("/ws/alerts")
+async def alert_stream(
+    websocket: WebSocket,
+    device_id: Optional[List[str]] = Query(None),
+    queue_size: int = Query(100, ge=1, le=1000)
+):
+    if await websocket_admin(websocket) is None:
+        await websocket.close(code=1008)  # policy violation
+        return
     await websocket.accept()
+    subscriber = alert_hub.subscribe(device_id, queue_size, "drop")
+    sender = asyncio.create_task(_pump(websocket, subscriber))
     try:
         while True:
-            fake_data = {"device": "DEV123", "status": "active"}  # example
-            await websocket.send_json(fake_data)
-            await asyncio.sleep(2)  # stream every 2 seconds
+            await websocket.receive_text()
     except WebSocketDisconnect:
-        print("Client disconnected")
\ No newline at end of file
+        pass
+    finally:
+        sender.cancel()
+        alert_hub.unsubscribe(subscriber)
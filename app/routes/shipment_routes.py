@@ -1,15 +1,22 @@
 # app/routes/shipment_routes.py 
-from fastapi import APIRouter, HTTPException, Depends, Request, Form
-from fastapi.responses import HTMLResponse, RedirectResponse, JSONResponse
-from fastapi.templating import Jinja2Templates
-from app.models.shipment_models import Shipment
+from fastapi import APIRouter, HTTPException, Depends, Request, Form, Query
+from fastapi.responses import HTMLResponse, RedirectResponse, StreamingResponse
+from app.templates import templates, stream_template
+from app.models.shipment_models import Shipment, ShipmentSummary
 from app.utils.rbac import get_current_user, is_admin
 from app.db.mongodb import db
+from app.db.shipment_store import list_shipments, list_shipment_conditions, shipment_document
+from app.db.device_store import latest_readings
+from app.utils.cache import cache
+from app.utils.serialization import ORJSONResponse
+from app.utils.shipment_io import (iter_lines, iter_csv_rows, iter_ndjson_rows, import_shipments,
+                                   export_csv, export_ndjson, EXPORT_FIELDS)
 from bson import ObjectId
-from typing import List
+from pymongo.errors import DuplicateKeyError
+from typing import List, Optional
+from urllib.parse import urlencode
 
 router = APIRouter()
-templates = Jinja2Templates(directory="app/templates")
 
 # Create shipment form 
 @router.get("/create", response_class=HTMLResponse, tags=["Shipments"])
@@ -41,10 +48,14 @@ async def create_shipment(request: Request, user=Depends(get_current_user),
     ) 
     
     # Add the creator's username to the shipment data
-    shipment_data = shipment.model_dump()
+    shipment_data = shipment_document(shipment)
     shipment_data["createdBy"] = user.get("sub") # 'sub' typically holds the username from the token
 
-    await db.shipments.insert_one(shipment_data) 
+    try:
+        await db.shipments.insert_one(shipment_data)
+    except DuplicateKeyError:
+        return RedirectResponse(url="/shipment/create?msg=Shipment+number+already+exists", status_code=303)
+    cache.invalidate("shipments")
     
     redirect_url = "/admin/dashboard" if user["role"] == "admin" else "/user/dashboard" 
     return RedirectResponse(url=f"{redirect_url}?msg=Shipment+created+successfully",status_code=303) 
@@ -70,24 +81,118 @@ async def update_shipment(shipment_id: str, request: Request, user=Depends(is_ad
         expectedDeliveryDate=expectedDeliveryDate, deliveryNumber=deliveryNumber,
         batchNumber=batchNumber, shipmentDescription=shipmentDescription
     ) 
-    result = await db.shipments.update_one({"_id": ObjectId(shipment_id)}, {"$set": shipment.model_dump()}) 
+    try:
+        result = await db.shipments.update_one({"_id": ObjectId(shipment_id)}, {"$set": shipment_document(shipment)})
+    except DuplicateKeyError:
+        raise HTTPException(status_code=409, detail="Another shipment already has this shipment number")
     if result.modified_count == 0:
         raise HTTPException(status_code=404, detail="Shipment not found or data was not changed") 
+    cache.invalidate("shipments")
     return RedirectResponse(url="/admin/dashboard?msg=Shipment+updated+successfully", status_code=303) 
 
 
+# Listing parameters shared by the page and the API
+async def shipment_listing(
+    sort: str = Query("expectedDeliveryDate", pattern="^(expectedDeliveryDate|shipmentNumber)$"),
+    order: str = Query("asc", pattern="^(asc|desc)$"),
+    goodsType: Optional[str] = Query(None),
+    device: Optional[str] = Query(None),
+    createdBy: Optional[str] = Query(None),
+    prefix: Optional[str] = Query(None, description="Start of shipmentDescription"),
+    q: Optional[str] = Query(None, description="Full-text search over shipmentDescription"),
+    after: Optional[str] = Query(None, description="Cursor for the next page"),
+    limit: int = Query(50, ge=1, le=500)
+):
+    return {
+        "sort": sort, "descending": order == "desc", "limit": limit, "after": after,
+        "filters": {"goodsType": goodsType, "device": device, "createdBy": createdBy},
+        "prefix": prefix, "q": q,
+    }
+
 # FRONTEND ROUTE 
 @router.get("/manage", response_class=HTMLResponse, include_in_schema=False)
-async def manage_shipments_page(request: Request, user=Depends(is_admin)): 
-    shipments = await db.shipments.find().to_list(length=100) 
-    return templates.TemplateResponse("manage_shipments.html", {"request": request, "shipments": shipments}) 
+async def manage_shipments_page(request: Request, user=Depends(is_admin), listing: dict = Depends(shipment_listing)): 
+    async def render():
+        shipments, next_cursor = await list_shipments(**listing)
+        next_url = None
+        if next_cursor:
+            params = {k: v for k, v in request.query_params.items() if k != "after"}
+            next_url = "/shipment/manage?" + urlencode({**params, "after": next_cursor})
+        return stream_template("manage_shipments.html", {
+            "request": request,
+            "shipments": shipments,
+            "next_url": next_url,
+            "params": request.query_params,
+        })
+    return await cache.page(request, "manage_shipments", render, tags=("shipments",))
 
 
 # API ROUTE FOR SWAGGER
-@router.get("/manage/api", response_model=List[Shipment], tags=["Shipments"])
-async def manage_shipments_api(user=Depends(is_admin)):
-    shipments = []
-    for doc in await db.shipments.find().to_list(length=None):
-        doc["id"] = str(doc["_id"])
-        shipments.append(doc)
-    return shipments
\ No newline at end of file
+# The cursor for the next page is returned in the X-Next-Cursor header
+@router.get("/manage/api", response_model=List[ShipmentSummary], tags=["Shipments"])
+async def manage_shipments_api(user=Depends(is_admin), listing: dict = Depends(shipment_listing)):
+    shipments, next_cursor = await list_shipments(**listing)
+    # LIST_PROJECTION already gives the ShipmentSummary fields, so the rows
+    # are sent without being revalidated against the response model
+    for doc in shipments:
+        doc["id"] = doc.pop("_id")
+    return ORJSONResponse(shipments, headers={"X-Next-Cursor": next_cursor} if next_cursor else None)
+
+
+# Listing page with each shipment's live condition: latest reading per linked
+# device and a temperature/battery summary over the last `hours`, from one
+# aggregation. Readings this worker ingested more recently replace the stored ones.
+@router.get("/conditions", tags=["Shipments"])
+async def shipment_conditions_api(user=Depends(is_admin),
+                                  listing: dict = Depends(shipment_listing),
+                                  hours: int = Query(24, ge=1, le=24 * 90)):
+    shipments, next_cursor = await list_shipment_conditions(**listing, hours=hours)
+    for doc in shipments:
+        doc["id"] = doc.pop("_id")
+        for device_id in doc.get("deviceIds", []):
+            fresh = latest_readings.get(device_id)
+            if fresh is not None:
+                doc["latest"][device_id] = {k: v for k, v in fresh.items() if k != "_id"}
+    return ORJSONResponse(shipments, headers={"X-Next-Cursor": next_cursor} if next_cursor else None)
+
+
+# Bulk import: streams a CSV (with header row) or NDJSON body, validates each
+# row against Shipment and upserts on shipmentNumber in batches. Returns a
+# per-row error report. The format comes from ?format= or the content type; a
+# plain JSON document (e.g. an array) can't be streamed row by row, so it is
+# refused up front rather than failing on every line.
+@router.post("/import", tags=["Shipments"])
+async def import_shipments_api(request: Request, user=Depends(is_admin),
+                               format: Optional[str] = Query(None, pattern="^(csv|ndjson)$")):
+    content_type = request.headers.get("content-type", "").lower()
+    if format is None:
+        if "ndjson" in content_type:
+            format = "ndjson"
+        elif "json" in content_type:
+            raise HTTPException(status_code=415, detail="Send shipments as NDJSON (application/x-ndjson, "
+                                                        "one JSON object per line) or CSV, not a JSON document")
+        else:
+            format = "csv"
+    lines = iter_lines(request.stream())
+    rows = iter_csv_rows(lines) if format == "csv" else iter_ndjson_rows(lines)
+    try:
+        return await import_shipments(rows, user.get("sub"))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    finally:
+        # rows may have been written before a failure
+        cache.invalidate("shipments")
+
+# Streaming export of every shipment matching the optional filters
+@router.get("/export", tags=["Shipments"])
+async def export_shipments_api(user=Depends(is_admin),
+                               format: str = Query("csv", pattern="^(csv|ndjson)$"),
+                               goodsType: Optional[str] = Query(None),
+                               device: Optional[str] = Query(None),
+                               createdBy: Optional[str] = Query(None)):
+    query_filter = {k: v for k, v in {"goodsType": goodsType, "device": device, "createdBy": createdBy}.items() if v}
+    cursor = db.shipments.find(query_filter, {field: 1 for field in EXPORT_FIELDS}).batch_size(1000)
+    if format == "csv":
+        return StreamingResponse(export_csv(cursor), media_type="text/csv",
+                                 headers={"Content-Disposition": "attachment; filename=shipments.csv"})
+    return StreamingResponse(export_ndjson(cursor), media_type="application/x-ndjson")
@@ -1,23 +1,27 @@
 # app/routes/user_routes.py 
 from fastapi import APIRouter, Depends, Request, Form, HTTPException
 from fastapi.responses import HTMLResponse, RedirectResponse
-from fastapi.templating import Jinja2Templates
-from app.utils.rbac import is_admin, get_current_user
-from app.db.mongodb import db
+from app.templates import templates
+from app.utils.rbac import is_admin, get_current_user, revoke_user_tokens
+from app.db.mongodb import db, dashboard_db
+from app.utils.cache import cache
 
 router = APIRouter()
-templates = Jinja2Templates(directory="app/templates")
 
 # Admin dashboard 
 @router.get("/admin/dashboard", response_class=HTMLResponse)
 async def admin_dashboard(request: Request, user=Depends(is_admin)):
-    return templates.TemplateResponse("admin_dashboard.html", {"request": request, "user": user})
+    async def render():
+        return templates.TemplateResponse("admin_dashboard.html", {"request": request, "user": user})
+    return await cache.page(request, "admin_dashboard", render, vary=(user["sub"],))
 
 # Admin: view all users 
 @router.get("/admin/users", response_class=HTMLResponse)
 async def list_users(request: Request, user=Depends(is_admin)):
-    users = await db.users.find().to_list(100)
-    return templates.TemplateResponse("user_list.html", {"request": request, "users": users})
+    async def render():
+        users = await dashboard_db.users.find().to_list(100)
+        return templates.TemplateResponse("user_list.html", {"request": request, "users": users})
+    return await cache.page(request, "user_list", render, tags=("users",))
 
 # Form to update user role 
 @router.get("/admin/edit-user", response_class=HTMLResponse)
@@ -33,19 +37,28 @@ async def update_user_role(username: str = Form(...), new_role: str = Form(...),
     )
     if result.modified_count == 0:
         raise HTTPException(status_code=404, detail="User not found or role unchanged")
+    # sessions still carry the old role
+    await revoke_user_tokens(username)
+    cache.invalidate("users")
     return RedirectResponse(url="/admin/users?msg=Role+updated+successfully", status_code=303)
 
 
 # User dashboard 
 @router.get("/user/dashboard", response_class=HTMLResponse)
 async def user_dashboard(request: Request, user=Depends(get_current_user)):
-    return templates.TemplateResponse("user_dashboard.html", {"request": request, "user": user})
+    async def render():
+        return templates.TemplateResponse("user_dashboard.html", {"request": request, "user": user})
+    return await cache.page(request, "user_dashboard", render, vary=(user["sub"],))
 
 # User profile/info page 
 @router.get("/user/info", response_class=HTMLResponse)
 async def user_info(request: Request, user=Depends(get_current_user)):
-    db_user = await db.users.find_one({"username": user["sub"]})
-    return templates.TemplateResponse("user_info.html", {"request": request, "user": user, "email": db_user["email"]})
+    email = user.get("email")
+    if email is None:
+        # tokens issued before email was added to the claims
+        db_user = await db.users.find_one({"username": user["sub"]}, {"email": 1})
+        email = db_user["email"]
+    return templates.TemplateResponse("user_info.html", {"request": request, "user": user, "email": email})
 
 # deleting a user from form 
 @router.post("/admin/delete-user")
@@ -53,4 +66,6 @@ async def delete_user(username: str = Form(...), user=Depends(is_admin)):
     result = await db.users.delete_one({"username": username})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="User not found")
+    await revoke_user_tokens(username)
+    cache.invalidate("users")
     return RedirectResponse(url="/admin/users?msg=User+deleted+successfully", status_code=303)
@@ -1,5 +1,86 @@
 # app/templates.py
+import os
+import time
+from fastapi.responses import StreamingResponse
 from fastapi.templating import Jinja2Templates
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader, Template, select_autoescape
+from app.utils.private_dir import private_dir
+from app.utils.request_timing import add_time, timed
 
-# Point to the directory where your HTML files are located
-templates = Jinja2Templates(directory="app/templates")
\ No newline at end of file
+TEMPLATE_DIR = "app/templates"
+# Compiled templates are written here and reused by every worker and restart;
+# empty disables the on-disk cache. The bytecode is loaded back, so the
+# directory must belong to the app (see private_dir).
+TEMPLATE_BYTECODE_DIR = os.getenv("TEMPLATE_BYTECODE_DIR", "var/jinja-cache")
+# Re-check template files for changes on every render (development)
+TEMPLATE_AUTO_RELOAD = os.getenv("TEMPLATE_AUTO_RELOAD", "true").lower() in ("1", "true", "yes")
+# Streamed pages are sent in pieces of about this many characters
+STREAM_CHUNK_SIZE = 16 * 1024
+
+
+def _bytecode_cache():
+    if not TEMPLATE_BYTECODE_DIR:
+        return None
+    return FileSystemBytecodeCache(private_dir(TEMPLATE_BYTECODE_DIR))
+
+
+# Render time is booked to the request's "template" phase
+class TimedTemplate(Template):
+    def render(self, *args, **kwargs):
+        with timed("template"):
+            return super().render(*args, **kwargs)
+
+    def generate(self, *args, **kwargs):
+        pieces = super().generate(*args, **kwargs)
+        while True:
+            started = time.perf_counter()
+            piece = next(pieces, None)
+            add_time("template", time.perf_counter() - started)
+            if piece is None:
+                return
+            yield piece
+
+
+# The one template environment every router renders with
+env = Environment(
+    loader=FileSystemLoader(TEMPLATE_DIR),
+    autoescape=select_autoescape(),
+    bytecode_cache=_bytecode_cache(),
+    auto_reload=TEMPLATE_AUTO_RELOAD,
+)
+env.template_class = TimedTemplate
+templates = Jinja2Templates(env=env)
+
+
+# Compiles every template into the environment (and the bytecode cache) so
+# the first request to each page doesn't pay for it. Returns the seconds taken.
+def precompile_templates() -> float:
+    started = time.perf_counter()
+    for name in env.list_templates(extensions=["html"]):
+        env.get_template(name)
+    return time.perf_counter() - started
+
+
+def _chunks(template, context: dict):
+    buffer, size = [], 0
+    for piece in template.generate(context):
+        buffer.append(piece)
+        size += len(piece)
+        if size >= STREAM_CHUNK_SIZE:
+            yield "".join(buffer)
+            buffer, size = [], 0
+    if buffer:
+        yield "".join(buffer)
+
+
+# Renders a template as it is sent, for pages with large tables: the head of
+# the page goes out before the rows are rendered. Rendering runs in the
+# threadpool, like any sync iterator passed to StreamingResponse.
+def stream_template(name: str, context: dict, status_code: int = 200) -> StreamingResponse:
+    template = env.get_template(name)
+    return StreamingResponse(_chunks(template, context), status_code=status_code, media_type="text/html")
+
+
+if __name__ == "__main__":
+    # run at image build time to ship a warm bytecode cache
+    print(f"compiled templates into {TEMPLATE_BYTECODE_DIR or 'memory'} in {precompile_templates() * 1000:.1f}ms")
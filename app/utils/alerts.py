@@ -0,0 +1,216 @@
+# app/utils/alerts.py
+import logging
+from datetime import datetime, timezone
+from bson import ObjectId
+from app.utils.latest_readings import epoch
+from app.utils.metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+# A windowed rule keeps this many sub-buckets per device, so its state is a
+# fixed-size ring whatever the reading rate
+WINDOW_SLOTS = 10
+
+
+# Running average over a trailing window: the window is split into
+# WINDOW_SLOTS slots of (sum, count) and the totals are kept up to date as
+# slots roll off, so adding a reading is O(1).
+class SlidingAverage:
+    __slots__ = ("slot_seconds", "sums", "counts", "head", "total", "count")
+
+    def __init__(self, window_seconds: float):
+        self.slot_seconds = window_seconds / WINDOW_SLOTS
+        self.sums = [0.0] * WINDOW_SLOTS
+        self.counts = [0] * WINDOW_SLOTS
+        self.head = None
+        self.total = 0.0
+        self.count = 0
+
+    def add(self, ts: float, value: float):
+        slot = int(ts // self.slot_seconds)
+        if self.head is None:
+            self.head = slot
+        elif slot > self.head:
+            for expired in range(self.head + 1, min(slot, self.head + WINDOW_SLOTS) + 1):
+                i = expired % WINDOW_SLOTS
+                self.total -= self.sums[i]
+                self.count -= self.counts[i]
+                self.sums[i] = 0.0
+                self.counts[i] = 0
+            self.head = slot
+        elif slot <= self.head - WINDOW_SLOTS:
+            return  # older than the window
+        i = slot % WINDOW_SLOTS
+        self.sums[i] += value
+        self.counts[i] += 1
+        self.total += value
+        self.count += 1
+
+    @property
+    def average(self) -> float:
+        return self.total / self.count
+
+
+class Rule:
+    __slots__ = ("id", "name", "metric", "above", "threshold", "clear_threshold", "window_seconds",
+                 "device_id", "goods_type")
+
+    def __init__(self, doc: dict):
+        self.id = str(doc["_id"])
+        self.name = doc["name"]
+        self.metric = doc["metric"]
+        self.above = doc["op"] == "above"
+        self.threshold = doc["threshold"]
+        self.clear_threshold = doc.get("clear_threshold", self.threshold)
+        self.window_seconds = doc.get("window_minutes", 0) * 60
+        self.device_id = doc.get("device_id")
+        self.goods_type = doc.get("goodsType")
+
+    def breached(self, value: float) -> bool:
+        return value > self.threshold if self.above else value < self.threshold
+
+    def cleared(self, value: float) -> bool:
+        return value <= self.clear_threshold if self.above else value >= self.clear_threshold
+
+
+# Per (rule, device): the sliding average for windowed rules and the open
+# alert, if any
+class RuleState:
+    __slots__ = ("window", "alert")
+
+    def __init__(self, rule: Rule):
+        self.window = SlidingAverage(rule.window_seconds) if rule.window_seconds else None
+        self.alert = None
+
+
+# Evaluates readings as they are ingested. Rules are matched to a reading
+# by device_id, by the goodsType of the shipments linked to the device, or
+# globally; the matched rules and their state are cached per device. Only transitions produce
+# events ("open" when a rule is breached, "resolved" when it clears), so a
+# device staying out of range raises one alert, not one per reading.
+class AlertEngine:
+    def __init__(self):
+        self.rules = []
+        self.device_goods = {}
+        self.rules_for_device = {}
+        self.states = {}
+        self.evaluated = 0
+        self.opened = 0
+        self.resolved = 0
+
+    def set_rules(self, docs: list):
+        self.rules = [Rule(doc) for doc in docs]
+        live = {rule.id: rule for rule in self.rules}
+        # keep open alerts and windows of rules that still exist
+        self.states = {key: state for key, state in self.states.items()
+                       if key[0] in live and _same_window(live[key[0]], state)}
+        self.rules_for_device.clear()
+
+    def set_device_goods(self, device_goods: dict):
+        self.device_goods = device_goods
+        self.rules_for_device.clear()
+
+    # Takes the open alerts as stored, so a restart does not raise them again
+    # and alerts opened or resolved by another process are seen here too
+    def restore(self, alerts: list):
+        live = {rule.id: rule for rule in self.rules}
+        open_keys = set()
+        for alert in alerts:
+            rule = live.get(alert["rule_id"])
+            if rule is not None:
+                self._state(rule, alert["device_id"]).alert = alert
+                open_keys.add((rule.id, alert["device_id"]))
+        for key, state in self.states.items():
+            if key not in open_keys:
+                state.alert = None
+
+    # Swaps an alert this engine just opened for the one another process had
+    # already stored, so resolving it here resolves theirs
+    def adopt(self, stored: dict, opened: dict):
+        state = self.states.get((opened["rule_id"], opened["device_id"]))
+        if state is not None and state.alert is opened:
+            state.alert = stored
+
+    # (rule, state) pairs for every rule that applies to the device
+    def _bound(self, device_id: str) -> list:
+        bound = self.rules_for_device.get(device_id)
+        if bound is None:
+            goods = self.device_goods.get(device_id, ())
+            bound = [(rule, self._state(rule, device_id)) for rule in self.rules
+                     if (rule.device_id is None and rule.goods_type is None)
+                     or rule.device_id == device_id or rule.goods_type in goods]
+            self.rules_for_device[device_id] = bound
+        return bound
+
+    def _state(self, rule: Rule, device_id: str) -> RuleState:
+        state = self.states.get((rule.id, device_id))
+        if state is None:
+            state = self.states[(rule.id, device_id)] = RuleState(rule)
+        return state
+
+    # Returns the alert events this reading caused
+    def evaluate(self, doc: dict) -> list:
+        bound = self.rules_for_device.get(doc["device_id"])
+        if bound is None:
+            bound = self._bound(doc["device_id"])
+        if not bound:
+            return []
+        self.evaluated += 1
+        events = []
+        ts = None
+        for rule, state in bound:
+            value = doc[rule.metric]
+            if state.window is not None:
+                if ts is None:
+                    ts = epoch(doc["timestamp"])
+                state.window.add(ts, value)
+                value = state.window.average
+            if state.alert is None:
+                if rule.breached(value):
+                    state.alert = _alert(rule, doc, value)
+                    self.opened += 1
+                    events.append(("open", state.alert))
+            elif rule.cleared(value):
+                alert = {**state.alert, "status": "resolved", "resolved_at": doc["timestamp"], "resolved_value": value}
+                state.alert = None
+                self.resolved += 1
+                events.append(("resolved", alert))
+        return events
+
+    def evaluate_many(self, docs: list) -> list:
+        events = []
+        for doc in docs:
+            events.extend(self.evaluate(doc))
+        return events
+
+    @property
+    def open_alerts(self) -> int:
+        return sum(1 for state in self.states.values() if state.alert is not None)
+
+
+def _same_window(rule: Rule, state: RuleState) -> bool:
+    if state.window is None:
+        return not rule.window_seconds
+    return state.window.slot_seconds * WINDOW_SLOTS == rule.window_seconds
+
+
+def _alert(rule: Rule, doc: dict, value: float) -> dict:
+    return {
+        "_id": ObjectId(), "rule_id": rule.id, "rule": rule.name, "device_id": doc["device_id"], "metric": rule.metric,
+        "op": "above" if rule.above else "below", "threshold": rule.threshold, "value": value,
+        "window_minutes": rule.window_seconds / 60, "status": "open", "opened_at": doc["timestamp"],
+        "raised_at": datetime.now(timezone.utc),
+    }
+
+
+alert_engine = AlertEngine()
+
+
+@REGISTRY.register_collector
+def _collect_alerts():
+    yield ("alert_rules", "Alert rules loaded", "gauge", [({}, len(alert_engine.rules))])
+    yield ("alert_readings_evaluated_total", "Readings evaluated against at least one rule", "counter",
+           [({}, alert_engine.evaluated)])
+    yield ("alerts_opened_total", "Alerts raised", "counter", [({}, alert_engine.opened)])
+    yield ("alerts_resolved_total", "Alerts resolved", "counter", [({}, alert_engine.resolved)])
+    yield ("alerts_open", "Alerts currently open", "gauge", [({}, alert_engine.open_alerts)])
@@ -3,14 +3,22 @@
 from jose import JWTError, jwt
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
+from collections import OrderedDict
+import hashlib
 import os
+import time
 from fastapi.security import OAuth2PasswordBearer
+from app.utils.metrics import REGISTRY
 
 # Load environment variables
 load_dotenv()
 JWT_SECRET = os.getenv("JWT_SECRET")
 JWT_ALGORITHM = os.getenv("JWT_ALGORITHM")
 JWT_EXPIRE_MINUTES = int(os.getenv("JWT_EXPIRE_MINUTES", 30))
+# Verified tokens kept per worker; 0 disables the cache
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", 10000))
+# Logged-out tokens remembered per worker until they expire
+REVOKED_TOKENS_MAX = int(os.getenv("REVOKED_TOKENS_MAX", 10000))
 
 # used by cookie-based HTML login
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
@@ -26,10 +34,87 @@ def create_access_token(data: dict):
     encoded_jwt = jwt.encode(to_encode, JWT_SECRET, algorithm=JWT_ALGORITHM)
     return encoded_jwt
 
-# Decode & verify JWT token
+# LRU of verified claims keyed by token digest; entries die at the token's exp
+class TokenCache:
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, digest: bytes):
+        entry = self.entries.get(digest)
+        if entry is None:
+            self.misses += 1
+            return None
+        claims, expires_at = entry
+        if expires_at <= time.time():
+            del self.entries[digest]
+            self.misses += 1
+            return None
+        self.entries.move_to_end(digest)
+        self.hits += 1
+        return claims
+
+    def put(self, digest: bytes, claims: dict, expires_at: float):
+        if self.maxsize <= 0:
+            return
+        self.entries[digest] = (claims, expires_at)
+        self.entries.move_to_end(digest)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+    def discard(self, digest: bytes):
+        self.entries.pop(digest, None)
+
+    def clear(self):
+        self.entries.clear()
+
+token_cache = TokenCache(TOKEN_CACHE_SIZE)
+# Denylisted token digests (e.g. logged out) and when they expire anyway,
+# oldest first
+revoked_tokens = OrderedDict()
+
+@REGISTRY.register_collector
+def _collect_token_cache():
+    yield ("token_cache_hits_total", "Token verifications answered from the cache", "counter", [({}, token_cache.hits)])
+    yield ("token_cache_misses_total", "Token verifications that decoded the JWT", "counter", [({}, token_cache.misses)])
+    yield ("token_cache_entries", "Verified tokens cached", "gauge", [({}, len(token_cache.entries))])
+
+def token_digest(token: str) -> bytes:
+    return hashlib.sha256(token.encode()).digest()
+
+# Logout denylist. Only tokens that verify are added (a forged or expired
+# one is rejected anyway), so entries are bounded by real sessions and their
+# lifetime; past REVOKED_TOKENS_MAX the oldest are dropped. The denylist
+# lives in the worker that served the logout: other workers keep accepting
+# the token until it expires. Use rbac.revoke_user_tokens to end a user's
+# sessions everywhere.
+def revoke_token(token: str):
+    digest = token_digest(token)
+    now = time.time()
+    for expired in [d for d, exp in revoked_tokens.items() if exp <= now]:
+        del revoked_tokens[expired]
+    try:
+        claims = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
+    except JWTError:
+        return
+    revoked_tokens[digest] = float(claims.get("exp", now))
+    while len(revoked_tokens) > REVOKED_TOKENS_MAX:
+        revoked_tokens.popitem(last=False)
+    token_cache.discard(digest)
+
+# Decode & verify JWT token, reusing the claims of tokens verified before
 def verify_token(token: str):
+    digest = token_digest(token)
+    if digest in revoked_tokens:
+        return None
+    payload = token_cache.get(digest)
+    if payload is not None:
+        return payload
     try:
         payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
-        return payload
     except JWTError:
         return None
+    token_cache.put(digest, payload, float(payload.get("exp", time.time())))
+    return payload
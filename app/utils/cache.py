@@ -0,0 +1,204 @@
+# app/utils/cache.py
+import hashlib
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from dotenv import load_dotenv
+from fastapi import Request, Response
+from fastapi.responses import HTMLResponse, StreamingResponse
+from app.utils.metrics import REGISTRY
+from app.utils.private_dir import private_dir
+
+load_dotenv()
+
+# "lru" keeps entries in each worker; "sqlite" keeps them in one file shared
+# by the workers on a host, standing in for a shared cache such as Redis
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "lru")
+CACHE_SIZE = int(os.getenv("CACHE_SIZE", 1000))
+# Entries are unpickled, so the file's directory must belong to the app (see private_dir)
+CACHE_SQLITE_PATH = os.getenv("CACHE_SQLITE_PATH", "var/cache.sqlite3")
+CACHE_DEFAULT_TTL = float(os.getenv("CACHE_DEFAULT_TTL", 60))
+
+cache_requests = REGISTRY.counter("cache_requests_total", "Cache lookups by cache name and result", ["cache", "result"])
+cache_invalidations = REGISTRY.counter("cache_invalidations_total", "Tag invalidations", ["tag"])
+
+
+# Backends store opaque values with an expiry, plus a version number per
+# tag. Tag versions are kept apart from the entries so eviction never
+# resets them.
+class LRUBackend:
+    def __init__(self, maxsize: int = CACHE_SIZE):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.versions = {}
+
+    def get(self, key: str):
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at <= time.monotonic():
+            del self.entries[key]
+            return None
+        self.entries.move_to_end(key)
+        return value
+
+    def set(self, key: str, value, ttl: float):
+        self.entries[key] = (value, time.monotonic() + ttl)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+    def versions_of(self, tags) -> tuple:
+        return tuple(self.versions.get(tag, 0) for tag in tags)
+
+    def bump(self, tag: str):
+        self.versions[tag] = self.versions.get(tag, 0) + 1
+
+    def __len__(self):
+        return len(self.entries)
+
+
+# Entries and tag versions in a local SQLite file, so every worker on the
+# host sees the same entries and an invalidation in one worker reaches the
+# others. Calls are short local reads and writes made on the event loop.
+class SQLiteBackend:
+    def __init__(self, path: str = CACHE_SQLITE_PATH, maxsize: int = CACHE_SIZE):
+        self.maxsize = maxsize
+        self.lock = threading.Lock()
+        private_dir(os.path.dirname(path) or ".")
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=5)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, value BLOB, expires_at REAL)")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS versions (tag TEXT PRIMARY KEY, version INTEGER)")
+        self.writes = 0
+
+    def get(self, key: str):
+        with self.lock:
+            row = self.conn.execute("SELECT value, expires_at FROM entries WHERE key = ?", (key,)).fetchone()
+        if row is None or row[1] <= time.time():
+            return None
+        return pickle.loads(row[0])
+
+    def set(self, key: str, value, ttl: float):
+        with self.lock:
+            self.conn.execute("INSERT OR REPLACE INTO entries VALUES (?, ?, ?)",
+                              (key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL), time.time() + ttl))
+            self.writes += 1
+            if self.writes % 100 == 0:
+                self._prune()
+
+    def _prune(self):
+        self.conn.execute("DELETE FROM entries WHERE expires_at <= ?", (time.time(),))
+        self.conn.execute("DELETE FROM entries WHERE key NOT IN "
+                          "(SELECT key FROM entries ORDER BY expires_at DESC LIMIT ?)", (self.maxsize,))
+
+    def versions_of(self, tags) -> tuple:
+        if not tags:
+            return ()
+        with self.lock:
+            rows = dict(self.conn.execute(
+                f"SELECT tag, version FROM versions WHERE tag IN ({','.join('?' * len(tags))})", tuple(tags)).fetchall())
+        return tuple(rows.get(tag, 0) for tag in tags)
+
+    def bump(self, tag: str):
+        with self.lock:
+            self.conn.execute("INSERT INTO versions VALUES (?, 1) "
+                              "ON CONFLICT(tag) DO UPDATE SET version = version + 1", (tag,))
+
+    def __len__(self):
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+
+def create_backend(name: str = CACHE_BACKEND):
+    if name == "sqlite":
+        return SQLiteBackend()
+    if name == "lru":
+        return LRUBackend()
+    raise ValueError(f"Unknown cache backend {name!r}")
+
+
+# Query results and rendered pages, expiring after a TTL. Each entry names
+# the tags its data depends on ("shipments", "users", ...); the versions of
+# those tags are part of the key, so invalidate(tag) makes every dependent
+# entry unreachable at once.
+class Cache:
+    def __init__(self, backend, default_ttl: float = CACHE_DEFAULT_TTL):
+        self.backend = backend
+        self.default_ttl = default_ttl
+
+    def _key(self, name: str, params, tags) -> str:
+        versions = self.backend.versions_of(tags)
+        digest = hashlib.sha1(repr((params, tags, versions)).encode()).hexdigest()
+        return f"{name}:{digest}"
+
+    # The cached value, or loader()'s result stored for `ttl` seconds
+    async def get_or_set(self, name: str, params, loader, tags=(), ttl: float = None):
+        key = self._key(name, params, tuple(tags))
+        value = self.backend.get(key)
+        if value is not None:
+            cache_requests.inc(cache=name, result="hit")
+            return value
+        cache_requests.inc(cache=name, result="miss")
+        value = await loader()
+        self.backend.set(key, value, ttl or self.default_ttl)
+        return value
+
+    def invalidate(self, *tags):
+        for tag in tags:
+            self.backend.bump(tag)
+            cache_invalidations.inc(tag=tag)
+
+    # Rendered HTML for the request's path and query string (plus `vary`,
+    # e.g. the username), with an ETag; a matching If-None-Match gets a 304.
+    # `render` returns the response the route would have returned. A
+    # streamed response is passed through on a miss and stored once it has
+    # been sent in full, so only later requests get the ETag.
+    async def page(self, request: Request, name: str, render, tags=(), ttl: float = None, vary=()):
+        key = self._key(name, (request.url.path, str(request.query_params), tuple(vary)), tuple(tags))
+        entry = self.backend.get(key)
+        if entry is None:
+            cache_requests.inc(cache=name, result="miss")
+            response = await render()
+            if isinstance(response, StreamingResponse):
+                response.body_iterator = self._store_stream(response.body_iterator, key, ttl)
+                response.headers["Cache-Control"] = "private, no-cache"
+                return response
+            entry = _page_entry(response.body)
+            self.backend.set(key, entry, ttl or self.default_ttl)
+        else:
+            cache_requests.inc(cache=name, result="hit")
+        etag, body = entry
+        headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+        if etag in _if_none_match(request):
+            return Response(status_code=304, headers=headers)
+        return HTMLResponse(body, headers=headers)
+
+    async def _store_stream(self, chunks, key: str, ttl: float):
+        parts = []
+        async for chunk in chunks:
+            chunk = chunk.encode() if isinstance(chunk, str) else chunk
+            parts.append(chunk)
+            yield chunk
+        self.backend.set(key, _page_entry(b"".join(parts)), ttl or self.default_ttl)
+
+
+def _page_entry(body: bytes) -> tuple:
+    return '"' + hashlib.sha1(body).hexdigest() + '"', body
+
+
+def _if_none_match(request: Request) -> set:
+    value = request.headers.get("if-none-match", "")
+    return {tag.strip().removeprefix("W/") for tag in value.split(",") if tag.strip()}
+
+
+cache = Cache(create_backend())
+
+
+@REGISTRY.register_collector
+def _collect_cache():
+    yield ("cache_entries", "Entries held by the cache backend", "gauge", [({"backend": CACHE_BACKEND}, len(cache.backend))])
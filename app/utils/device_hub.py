@@ -0,0 +1,130 @@
+# app/utils/device_hub.py
+import asyncio
+import logging
+from collections import OrderedDict, deque
+from app.utils.metrics import REGISTRY
+from app.utils.serialization import dumps_str
+
+logger = logging.getLogger(__name__)
+
+# How a subscriber's queue behaves when the client falls behind:
+# "drop"     - keep the newest `maxsize` messages, discard the oldest
+# "coalesce" - keep only the latest message per device
+POLICIES = ("drop", "coalesce")
+
+
+class Subscriber:
+    def __init__(self, device_ids=None, maxsize: int = 100, policy: str = "drop"):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown policy {policy!r}")
+        self.device_ids = set(device_ids) if device_ids else None
+        self.maxsize = maxsize
+        self.policy = policy
+        self.pending = OrderedDict() if policy == "coalesce" else deque(maxlen=maxsize)
+        self.ready = asyncio.Event()
+        self.dropped = 0
+
+    # Never blocks: a slow client only ever loses its own messages
+    def offer(self, device_id: str, message: str):
+        if self.policy == "coalesce":
+            if device_id in self.pending:
+                self.dropped += 1
+                self.pending.move_to_end(device_id)
+            elif len(self.pending) >= self.maxsize:
+                self.pending.popitem(last=False)
+                self.dropped += 1
+            self.pending[device_id] = message
+        else:
+            if len(self.pending) == self.maxsize:
+                self.dropped += 1
+            self.pending.append(message)
+        self.ready.set()
+
+    # Waits for at least one message and drains everything queued
+    async def next_batch(self) -> list:
+        await self.ready.wait()
+        self.ready.clear()
+        if self.policy == "coalesce":
+            batch = list(self.pending.values())
+        else:
+            batch = list(self.pending)
+        self.pending.clear()
+        return batch
+
+
+# In-process pub/sub: each reading is serialized once and fanned out to the
+# subscribers for its device plus the subscribers to all devices.
+class DeviceHub:
+    def __init__(self):
+        self.by_device = {}
+        self.all_devices = set()
+        self.published = 0
+
+    def subscribe(self, device_ids=None, maxsize: int = 100, policy: str = "drop") -> Subscriber:
+        subscriber = Subscriber(device_ids, maxsize, policy)
+        if subscriber.device_ids is None:
+            self.all_devices.add(subscriber)
+        else:
+            for device_id in subscriber.device_ids:
+                self.by_device.setdefault(device_id, set()).add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        if subscriber.device_ids is None:
+            self.all_devices.discard(subscriber)
+            return
+        for device_id in subscriber.device_ids:
+            subscribers = self.by_device.get(device_id)
+            if subscribers is not None:
+                subscribers.discard(subscriber)
+                if not subscribers:
+                    del self.by_device[device_id]
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self.all_devices) + len({s for subs in self.by_device.values() for s in subs})
+
+    def publish(self, doc: dict):
+        device_id = doc["device_id"]
+        targets = self.by_device.get(device_id)
+        if not targets and not self.all_devices:
+            return
+        message = dumps_str({k: v for k, v in doc.items() if k != "_id"})
+        self.published += 1
+        for subscriber in self.all_devices:
+            subscriber.offer(device_id, message)
+        if targets:
+            for subscriber in targets:
+                subscriber.offer(device_id, message)
+
+    def publish_many(self, docs: list):
+        for doc in docs:
+            self.publish(doc)
+
+    # Publishes inserts seen on a change stream, for deployments where readings
+    # are written by other workers or processes. Needs a replica set and a
+    # regular (non time-series) device_data collection.
+    async def watch(self, collection):
+        pipeline = [{"$match": {"operationType": "insert"}}]
+        while True:
+            try:
+                async with collection.watch(pipeline) as stream:
+                    async for change in stream:
+                        self.publish(change["fullDocument"])
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Device change stream failed, reconnecting")
+                await asyncio.sleep(5)
+
+
+device_hub = DeviceHub()
+
+
+@REGISTRY.register_collector
+def _collect_hub():
+    subscribers = list(device_hub.all_devices) + list({s for subs in device_hub.by_device.values() for s in subs})
+    yield ("device_hub_subscribers", "Open device stream subscriptions", "gauge", [({}, len(subscribers))])
+    yield ("device_hub_published_total", "Readings fanned out by the hub", "counter", [({}, device_hub.published)])
+    yield ("device_hub_dropped_total", "Messages dropped or coalesced for open subscriptions", "counter",
+           [({}, sum(s.dropped for s in subscribers))])
@@ -0,0 +1,51 @@
+# app/utils/ingest_buffer.py
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+# Collects small writes in memory and hands them to `flush` as one batch once
+# `max_size` documents are pending or `max_delay` seconds have passed.
+class IngestBuffer:
+    def __init__(self, flush, max_size: int = 1000, max_delay: float = 1.0):
+        self.flush_fn = flush
+        self.max_size = max_size
+        self.max_delay = max_delay
+        self.pending = []
+        self.oldest = None
+        self.lock = asyncio.Lock()
+        self.task = None
+
+    async def add(self, docs: list):
+        if not self.pending:
+            self.oldest = time.monotonic()
+        self.pending.extend(docs)
+        if len(self.pending) >= self.max_size:
+            await self.flush()
+
+    async def flush(self):
+        async with self.lock:
+            if not self.pending:
+                return
+            batch, self.pending, self.oldest = self.pending, [], None
+            try:
+                await self.flush_fn(batch)
+            except Exception:
+                logger.exception("Dropped %d buffered documents", len(batch))
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.max_delay / 2)
+            if self.oldest is not None and time.monotonic() - self.oldest >= self.max_delay:
+                await self.flush()
+
+    def start(self):
+        if self.task is None:
+            self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+        await self.flush()
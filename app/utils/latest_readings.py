@@ -0,0 +1,35 @@
+# app/utils/latest_readings.py
+import time
+from datetime import timezone
+
+
+# Readings arrive with aware or naive (UTC) timestamps; compare them as epochs
+def epoch(ts) -> float:
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=timezone.utc)
+    return ts.timestamp()
+
+
+# Latest reading per device, kept in memory by the worker that ingests it.
+# Entries are trusted for `ttl` seconds; after that (or for devices this
+# worker has not seen) callers re-read the device_latest collection, which
+# every worker keeps up to date.
+class LatestReadings:
+    def __init__(self, ttl: float = 5.0):
+        self.ttl = ttl
+        self.readings = {}
+
+    def update(self, doc: dict):
+        current = self.readings.get(doc["device_id"])
+        if current is None or epoch(current[0]["timestamp"]) <= epoch(doc["timestamp"]):
+            self.readings[doc["device_id"]] = (doc, time.monotonic())
+
+    def update_many(self, docs: list):
+        for doc in docs:
+            self.update(doc)
+
+    def get(self, device_id: str):
+        entry = self.readings.get(device_id)
+        if entry is None or time.monotonic() - entry[1] > self.ttl:
+            return None
+        return entry[0]
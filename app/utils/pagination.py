@@ -0,0 +1,25 @@
+# app/utils/pagination.py
+import base64
+from bson import json_util
+from fastapi import HTTPException
+
+# Opaque keyset cursors: the sort key values of the last row on a page,
+# serialized with bson's json_util so datetimes and ObjectIds round-trip.
+def encode_cursor(*values) -> str:
+    raw = json_util.dumps(list(values)).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str, size: int = 2) -> list:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json_util.loads(base64.urlsafe_b64decode(padded))
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not isinstance(values, list) or len(values) != size:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return values
+
+# Filter selecting the rows strictly after (value, _id) in the given sort direction
+def keyset_filter(field: str, value, last_id, descending: bool = True) -> dict:
+    op = "$lt" if descending else "$gt"
+    return {"$or": [{field: {op: value}}, {field: value, "_id": {op: last_id}}]}
@@ -0,0 +1,115 @@
+# app/utils/passwords.py
+import asyncio
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from fastapi import HTTPException
+from passlib.context import CryptContext
+from app.utils.metrics import REGISTRY
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+# bcrypt costs tens of milliseconds of CPU per call, so it runs off the event
+# loop: "thread" (bcrypt releases the GIL), "process", or "inline" (on the
+# loop, only useful as a benchmark baseline).
+PASSWORD_HASH_POOL = os.getenv("PASSWORD_HASH_POOL", "thread")
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", min(4, os.cpu_count() or 1)))
+# Requests allowed to wait for a worker before new ones get a 503
+PASSWORD_HASH_MAX_QUEUE = int(os.getenv("PASSWORD_HASH_MAX_QUEUE", 256))
+
+
+def _hash(password: str) -> str:
+    return pwd_context.hash(password)
+
+
+def _verify_and_update(password: str, hashed: str):
+    return pwd_context.verify_and_update(password, hashed)
+
+
+class PasswordPool:
+    def __init__(self, mode: str = PASSWORD_HASH_POOL, workers: int = PASSWORD_HASH_WORKERS,
+                 max_queue: int = PASSWORD_HASH_MAX_QUEUE):
+        self.mode = mode
+        self.workers = workers
+        self.max_queue = max_queue
+        self.executor = None
+        self.semaphore = asyncio.Semaphore(workers)
+        # metrics
+        self.waiting = 0
+        self.running = 0
+        self.completed = 0
+        self.rejected = 0
+        self.wait_seconds_total = 0.0
+        self.max_waiting = 0
+
+    def _get_executor(self):
+        if self.executor is None:
+            if self.mode == "process":
+                self.executor = ProcessPoolExecutor(max_workers=self.workers)
+            else:
+                self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="bcrypt")
+        return self.executor
+
+    async def run(self, fn, *args):
+        if self.mode == "inline":
+            return fn(*args)
+        if self.waiting >= self.max_queue:
+            self.rejected += 1
+            raise HTTPException(status_code=503, detail="Too many logins in progress, try again shortly")
+        queued_at = time.monotonic()
+        self.waiting += 1
+        self.max_waiting = max(self.max_waiting, self.waiting)
+        try:
+            await self.semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        self.wait_seconds_total += time.monotonic() - queued_at
+        self.running += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._get_executor(), fn, *args)
+        finally:
+            self.running -= 1
+            self.completed += 1
+            self.semaphore.release()
+
+    def stats(self) -> dict:
+        return {
+            "mode": self.mode,
+            "workers": self.workers,
+            "waiting": self.waiting,
+            "running": self.running,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "max_waiting": self.max_waiting,
+            "avg_wait_seconds": self.wait_seconds_total / self.completed if self.completed else 0.0,
+        }
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False)
+            self.executor = None
+
+
+password_pool = PasswordPool()
+
+
+async def hash_password(password: str) -> str:
+    return await password_pool.run(_hash, password)
+
+
+# Returns (valid, new_hash); new_hash is set when the stored hash no longer
+# matches the CryptContext policy (deprecated scheme or rounds) and should be saved
+async def verify_password(password: str, hashed: str):
+    return await password_pool.run(_verify_and_update, password, hashed)
+
+
+@REGISTRY.register_collector
+def _collect_pool():
+    stats = password_pool.stats()
+    yield ("password_pool_waiting", "Password hash calls waiting for a worker", "gauge", [({}, stats["waiting"])])
+    yield ("password_pool_running", "Password hash calls running", "gauge", [({}, stats["running"])])
+    yield ("password_pool_completed_total", "Password hash calls completed", "counter", [({}, stats["completed"])])
+    yield ("password_pool_rejected_total", "Password hash calls rejected with 503", "counter", [({}, stats["rejected"])])
+    yield ("password_pool_wait_seconds_total", "Time password hash calls spent queued", "counter",
+           [({}, password_pool.wait_seconds_total)])
@@ -0,0 +1,13 @@
+# app/utils/private_dir.py
+import os
+import stat
+
+# Directory for files the app loads back and trusts (pickled cache entries,
+# compiled templates). Created 0700; an existing one must be ours and not
+# writable by anyone else, so another local user can't plant its contents.
+def private_dir(path: str) -> str:
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    info = os.lstat(path)
+    if not stat.S_ISDIR(info.st_mode) or info.st_uid != os.getuid() or info.st_mode & (stat.S_IWGRP | stat.S_IWOTH):
+        raise RuntimeError(f"{path} must be a directory owned by this user and writable only by it")
+    return path
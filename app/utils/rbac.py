@@ -1,24 +1,64 @@
 # app/utils/rbac.py
 
-from fastapi import Request, HTTPException, Depends, status
+from fastapi import Request, HTTPException, Depends, WebSocket, status
 from app.utils.auth import verify_token, oauth2_scheme_swagger
+from app.db.mongodb import db
+from app.utils.request_timing import timed
 from fastapi.security import OAuth2PasswordBearer
+import os
+import time
+
+# Tokens carry the user's token_version ("ver"); bumping it in the users
+# collection revokes every token issued before. Each worker re-reads a
+# user's version at most once per TOKEN_VERSION_TTL seconds.
+TOKEN_REVOCATION = os.getenv("TOKEN_REVOCATION", "true").lower() in ("1", "true", "yes")
+TOKEN_VERSION_TTL = float(os.getenv("TOKEN_VERSION_TTL", 30))
+token_versions = {}
+
+async def current_token_version(username: str):
+    cached = token_versions.get(username)
+    if cached is not None and time.monotonic() - cached[1] < TOKEN_VERSION_TTL:
+        return cached[0]
+    db_user = await db.users.find_one({"username": username}, {"token_version": 1})
+    version = db_user.get("token_version", 0) if db_user else None
+    token_versions[username] = (version, time.monotonic())
+    return version
+
+# Invalidates all of a user's sessions (role change, deletion)
+async def revoke_user_tokens(username: str):
+    await db.users.update_one({"username": username}, {"$inc": {"token_version": 1}})
+    token_versions.pop(username, None)
 
 oauth2_scheme_swagger = OAuth2PasswordBearer(tokenUrl="/auth/token", auto_error=False)
 #  Swagger UI and HTML frontend (cookie-based)
 async def get_current_user(request: Request, token: str = Depends(oauth2_scheme_swagger)):
-    cookie_token = request.cookies.get("access_token")
-    actual_token = cookie_token or token
-    if not actual_token:
-        raise HTTPException(status_code=401, detail="Not authenticated")
+    with timed("auth"):
+        cookie_token = request.cookies.get("access_token")
+        actual_token = cookie_token or token
+        if not actual_token:
+            raise HTTPException(status_code=401, detail="Not authenticated")
 
-    payload = verify_token(actual_token)
-    if payload is None:
-        raise HTTPException(status_code=401, detail="Invalid token")
-    return payload
+        payload = verify_token(actual_token)
+        if payload is None:
+            raise HTTPException(status_code=401, detail="Invalid token")
+        if TOKEN_REVOCATION and payload.get("ver", 0) != await current_token_version(payload.get("sub")):
+            raise HTTPException(status_code=401, detail="Token has been revoked")
+        return payload
 
 # Admin check using hybrid user
 async def is_admin(user: dict = Depends(get_current_user)):
     if user.get("role") != "admin":
         raise HTTPException(status_code=403, detail="Admin privileges required")
     return user
+
+# WebSockets can't use the dependencies above (no HTTP error response once the
+# handshake is underway): the same checks on the access_token cookie or a
+# ?token= query parameter, returning None instead of raising
+async def websocket_admin(websocket: WebSocket):
+    token = websocket.cookies.get("access_token") or websocket.query_params.get("token")
+    payload = verify_token(token) if token else None
+    if payload is None:
+        return None
+    if TOKEN_REVOCATION and payload.get("ver", 0) != await current_token_version(payload.get("sub")):
+        return None
+    return payload if payload.get("role") == "admin" else None
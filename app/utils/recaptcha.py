@@ -0,0 +1,167 @@
+# app/utils/recaptcha.py
+import asyncio
+import hashlib
+import logging
+import os
+import time
+import httpx
+from dotenv import load_dotenv
+from app.utils.metrics import REGISTRY
+from app.utils.request_timing import timed
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+# The endpoint is configurable so a local stub can stand in for Google
+RECAPTCHA_VERIFY_URL = os.getenv("RECAPTCHA_VERIFY_URL", "https://www.google.com/recaptcha/api/siteverify")
+RECAPTCHA_TIMEOUT = float(os.getenv("RECAPTCHA_TIMEOUT", 3.0))
+# Verdicts are reused for this long, for the same token and username only, so
+# a double-submitted form verifies once but a solved captcha can't be replayed
+# for other usernames or for long
+RECAPTCHA_CACHE_SECONDS = float(os.getenv("RECAPTCHA_CACHE_SECONDS", 5))
+RECAPTCHA_BREAKER_FAILURES = int(os.getenv("RECAPTCHA_BREAKER_FAILURES", 5))
+RECAPTCHA_BREAKER_RESET_SECONDS = float(os.getenv("RECAPTCHA_BREAKER_RESET_SECONDS", 30))
+VERDICT_CACHE_SIZE = 10000
+
+
+class RecaptchaUnavailable(Exception):
+    pass
+
+
+# Opens after `max_failures` consecutive failures; after `reset_seconds` one
+# trial request is let through and closes it again on success
+class CircuitBreaker:
+    def __init__(self, max_failures: int, reset_seconds: float):
+        self.max_failures = max_failures
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at = None
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_seconds:
+            return "half-open"
+        return "open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "half-open":
+            # let one trial through; re-arm so concurrent callers stay blocked
+            self.opened_at = time.monotonic()
+            return True
+        return state == "closed"
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+
+    def record_failure(self):
+        self.failures += 1
+        if self.failures >= self.max_failures:
+            self.opened_at = time.monotonic()
+
+
+class RecaptchaVerifier:
+    def __init__(self, url: str = RECAPTCHA_VERIFY_URL, timeout: float = RECAPTCHA_TIMEOUT,
+                 cache_seconds: float = RECAPTCHA_CACHE_SECONDS, transport=None):
+        self.url = url
+        self.timeout = timeout
+        self.cache_seconds = cache_seconds
+        self.transport = transport
+        self.client = None
+        self.breaker = CircuitBreaker(RECAPTCHA_BREAKER_FAILURES, RECAPTCHA_BREAKER_RESET_SECONDS)
+        self.verdicts = {}
+        self.inflight = {}
+        self.requests = 0
+        self.cache_hits = 0
+
+    # One pooled keep-alive client for the app's lifetime
+    async def start(self):
+        if self.client is None:
+            self.client = httpx.AsyncClient(
+                timeout=httpx.Timeout(self.timeout, connect=min(1.0, self.timeout)),
+                limits=httpx.Limits(max_connections=50, max_keepalive_connections=20, keepalive_expiry=60),
+                transport=self.transport,
+            )
+
+    async def close(self):
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+
+    def _cached(self, key: bytes):
+        entry = self.verdicts.get(key)
+        if entry is None:
+            return None
+        verdict, expires_at = entry
+        if expires_at <= time.monotonic():
+            del self.verdicts[key]
+            return None
+        return verdict
+
+    def _remember(self, key: bytes, verdict: bool):
+        if len(self.verdicts) >= VERDICT_CACHE_SIZE:
+            now = time.monotonic()
+            self.verdicts = {k: v for k, v in self.verdicts.items() if v[1] > now}
+            if len(self.verdicts) >= VERDICT_CACHE_SIZE:
+                self.verdicts.clear()
+        self.verdicts[key] = (verdict, time.monotonic() + self.cache_seconds)
+
+    async def _siteverify(self, secret: str, response_token: str) -> bool:
+        if not self.breaker.allow():
+            raise RecaptchaUnavailable("circuit open")
+        await self.start()
+        self.requests += 1
+        try:
+            with timed("http"):
+                reply = await self.client.post(self.url, data={"secret": secret, "response": response_token})
+            reply.raise_for_status()
+            result = reply.json()
+        except (httpx.HTTPError, ValueError) as e:
+            self.breaker.record_failure()
+            logger.warning("reCAPTCHA verification failed: %r", e)
+            raise RecaptchaUnavailable(str(e))
+        self.breaker.record_success()
+        return bool(result.get("success"))
+
+    # True/False for a verdict from the verifier; RecaptchaUnavailable when
+    # it could not be reached in time or the breaker is open. Verdicts are
+    # shared only between calls with the same token and `scope` (the username
+    # being logged in).
+    async def verify(self, secret: str, response_token: str, scope: str = "") -> bool:
+        key = hashlib.sha256(f"{scope}\0{response_token}".encode()).digest()
+        verdict = self._cached(key)
+        if verdict is not None:
+            self.cache_hits += 1
+            return verdict
+        pending = self.inflight.get(key)
+        if pending is not None:
+            self.cache_hits += 1
+            return await asyncio.shield(pending)
+
+        pending = asyncio.ensure_future(self._siteverify(secret, response_token))
+        self.inflight[key] = pending
+        try:
+            verdict = await asyncio.shield(pending)
+        finally:
+            self.inflight.pop(key, None)
+        self._remember(key, verdict)
+        return verdict
+
+    def stats(self) -> dict:
+        return {"requests": self.requests, "cache_hits": self.cache_hits, "breaker": self.breaker.state}
+
+
+recaptcha_verifier = RecaptchaVerifier()
+
+
+@REGISTRY.register_collector
+def _collect_recaptcha():
+    yield ("recaptcha_requests_total", "Calls made to the reCAPTCHA verifier", "counter",
+           [({}, recaptcha_verifier.requests)])
+    yield ("recaptcha_cache_hits_total", "Verifications answered from the verdict cache", "counter",
+           [({}, recaptcha_verifier.cache_hits)])
+    yield ("recaptcha_breaker_open", "1 while the verifier circuit breaker is open", "gauge",
+           [({}, 0 if recaptcha_verifier.breaker.state == "closed" else 1)])
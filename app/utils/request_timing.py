@@ -0,0 +1,207 @@
+# app/utils/request_timing.py
+import asyncio
+import collections
+import contextvars
+import hmac
+import logging
+import os
+import secrets
+import sys
+import threading
+import time
+import traceback
+from contextlib import contextmanager
+from app.utils.metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+# Where a request's time went. Each phase counts only its own time: time
+# spent in a nested phase (e.g. the DB lookup inside auth) is subtracted
+# from the outer one, and "other" is whatever no phase claimed.
+PHASES = ("db", "template", "auth", "http")
+# The loop is reported as stalled when a 100ms heartbeat is late by this much
+LOOP_STALL_THRESHOLD = float(os.getenv("LOOP_STALL_THRESHOLD", 0.25))
+# Per-request sampling profiler, requested with an "X-Profile: <secret>"
+# header carrying REQUEST_PROFILE_SECRET (it runs before auth, so the secret
+# is what keeps anyone else from writing files). Off unless enabled and the
+# secret is set, since samples are written to REQUEST_PROFILE_DIR.
+REQUEST_PROFILING = os.getenv("REQUEST_PROFILING", "false").lower() in ("1", "true", "yes")
+REQUEST_PROFILE_SECRET = os.getenv("REQUEST_PROFILE_SECRET", "")
+REQUEST_PROFILE_DIR = os.getenv("REQUEST_PROFILE_DIR", "/tmp/scm-profiles")
+REQUEST_PROFILE_INTERVAL = float(os.getenv("REQUEST_PROFILE_INTERVAL", 0.001))
+
+request_seconds = REGISTRY.histogram(
+    "http_request_seconds", "Request latency by route", ["method", "route", "status"])
+request_phase_seconds = REGISTRY.histogram(
+    "http_request_phase_seconds", "Request time by route and phase (db, template, auth, http, other)",
+    ["route", "phase"])
+loop_lag_seconds = REGISTRY.histogram(
+    "event_loop_lag_seconds", "How late the event loop ran a 100ms heartbeat",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0))
+loop_stalls = REGISTRY.counter("event_loop_stalls_total", "Times the event loop was blocked past the stall threshold")
+
+# The current request's phase totals; Motor copies the context into its
+# executor threads, so driver callbacks made for the request add to it
+_phases = contextvars.ContextVar("request_phases", default=None)
+
+
+def add_time(phase: str, seconds: float):
+    phases = _phases.get()
+    if phases is not None:
+        phases[phase] += seconds
+
+
+@contextmanager
+def timed(phase: str):
+    phases = _phases.get()
+    if phases is None:
+        yield
+        return
+    claimed_before = sum(phases.values())
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        nested = sum(phases.values()) - claimed_before
+        phases[phase] += max(0.0, elapsed - nested)
+
+
+# Pure ASGI so streamed responses are timed until their last chunk is sent
+class RequestTimingMiddleware:
+    def __init__(self, app):
+        self.app = app
+        self.profiling = False
+        if REQUEST_PROFILING and not REQUEST_PROFILE_SECRET:
+            logger.warning("REQUEST_PROFILING is on but REQUEST_PROFILE_SECRET is not set; requests won't be profiled")
+
+    # One profile at a time: the samples cover every concurrent request anyway
+    def _profile_requested(self, headers) -> bool:
+        if not REQUEST_PROFILING or not REQUEST_PROFILE_SECRET or self.profiling:
+            return False
+        value = next((value for name, value in headers if name == b"x-profile"), None)
+        return value is not None and hmac.compare_digest(value, REQUEST_PROFILE_SECRET.encode())
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        phases = dict.fromkeys(PHASES, 0.0)
+        token = _phases.set(phases)
+        status = 500
+        profiler = None
+        if self._profile_requested(scope.get("headers", [])):
+            self.profiling = True
+            profiler = RequestProfiler(threading.get_ident())
+            profiler.start()
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if profiler is not None:
+                    # the file name only; where it was written is in the log
+                    message.setdefault("headers", []).append((b"x-profile-id", profiler.id.encode()))
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            _phases.reset(token)
+            route = scope.get("route")
+            label = route.path if route is not None else "unmatched"
+            request_seconds.observe(elapsed, method=scope["method"], route=label, status=status)
+            for phase, seconds in phases.items():
+                request_phase_seconds.observe(seconds, route=label, phase=phase)
+            request_phase_seconds.observe(max(0.0, elapsed - sum(phases.values())), route=label, phase="other")
+            if profiler is not None:
+                try:
+                    profiler.stop(f"{scope['method']} {scope['path']}")
+                finally:
+                    self.profiling = False
+
+
+# Samples the event loop thread's stack every `interval` while a request
+# runs and writes the collapsed stacks (flamegraph input, one
+# "frame;frame;frame count" line per stack). Other requests served
+# concurrently show up in the samples too.
+class RequestProfiler:
+    def __init__(self, thread_id: int, interval: float = REQUEST_PROFILE_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = collections.Counter()
+        self.done = threading.Event()
+        os.makedirs(REQUEST_PROFILE_DIR, exist_ok=True)
+        self.id = f"{time.strftime('%Y%m%d-%H%M%S')}-{secrets.token_hex(4)}"
+        self.path = os.path.join(REQUEST_PROFILE_DIR, f"{self.id}.folded")
+        self.thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def _run(self):
+        while not self.done.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                stack = traceback.extract_stack(frame)
+                self.stacks[";".join(f"{f.name} ({os.path.basename(f.filename)}:{f.lineno})" for f in stack)] += 1
+
+    def stop(self, label: str):
+        self.done.set()
+        self.thread.join()
+        with open(self.path, "w") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        logger.info("Profiled %s: %d samples written to %s", label, sum(self.stacks.values()), self.path)
+
+
+# Heartbeat on the loop plus a watchdog thread. The heartbeat records how
+# late it ran; the watchdog logs the loop thread's stack once per stall
+# while the loop is still blocked, which is when the culprit is on it.
+class LoopMonitor:
+    def __init__(self, interval: float = 0.1, threshold: float = LOOP_STALL_THRESHOLD):
+        self.interval = interval
+        self.threshold = threshold
+        self.last_beat = time.monotonic()
+        self.stalled = False
+        self.task = None
+        self.thread = None
+        self.stopping = None
+
+    async def _beat(self):
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            loop_lag_seconds.observe(max(0.0, now - expected))
+            self.last_beat = now
+            self.stalled = False
+
+    def _watch(self, loop_thread_id: int):
+        while not self.stopping.wait(self.interval):
+            blocked = time.monotonic() - self.last_beat - self.interval
+            if blocked > self.threshold and not self.stalled:
+                self.stalled = True
+                loop_stalls.inc()
+                frame = sys._current_frames().get(loop_thread_id)
+                stack = "".join(traceback.format_stack(frame)) if frame is not None else "(no frame)"
+                logger.warning("Event loop blocked for %.0fms, loop thread stack:\n%s", blocked * 1000, stack)
+
+    def start(self):
+        self.last_beat = time.monotonic()
+        self.stopping = threading.Event()
+        self.task = asyncio.create_task(self._beat())
+        self.thread = threading.Thread(target=self._watch, args=(threading.get_ident(),),
+                                       name="loop-monitor", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+        if self.stopping is not None:
+            self.stopping.set()
+
+
+loop_monitor = LoopMonitor()
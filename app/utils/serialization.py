@@ -0,0 +1,28 @@
+# app/utils/serialization.py
+import orjson
+from bson import ObjectId
+from fastapi.responses import ORJSONResponse as _ORJSONResponse
+
+# orjson encodes datetime natively (ISO 8601, like datetime.isoformat());
+# ObjectId is the one Mongo type our documents carry that it doesn't know
+def _default(value):
+    if isinstance(value, ObjectId):
+        return str(value)
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+def dumps(value) -> bytes:
+    return orjson.dumps(value, default=_default)
+
+
+# For text frames (websockets) and str-joined NDJSON
+def dumps_str(value) -> str:
+    return orjson.dumps(value, default=_default).decode()
+
+
+# Default response class of the app. Returned directly from a route, the
+# content skips FastAPI's jsonable_encoder and response_model validation
+# too: use that for trusted reads whose shape is fixed by the projection.
+class ORJSONResponse(_ORJSONResponse):
+    def render(self, content) -> bytes:
+        return dumps(content)
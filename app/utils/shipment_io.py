@@ -0,0 +1,191 @@
+# app/utils/shipment_io.py
+import codecs
+import csv
+import io
+import json
+from pydantic import ValidationError
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from app.models.shipment_models import Shipment
+from app.db.mongodb import db
+from app.db.shipment_store import shipment_document
+from app.utils.serialization import dumps_str
+
+IMPORT_BATCH_SIZE = 1000
+# The report lists at most this many row errors; the rest are only counted
+MAX_REPORTED_ERRORS = 1000
+# A CSV record (a row, with any lines its quoted fields span) longer than this
+# is reported as an error instead of being buffered further
+MAX_CSV_RECORD_CHARS = 1024 * 1024
+EXPORT_FIELDS = list(Shipment.model_fields) + ["createdBy"]
+
+
+# Decoded text lines from a stream of byte chunks, without holding more
+# than one chunk and a partial line in memory
+async def iter_lines(chunks):
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    pending = ""
+    async for chunk in chunks:
+        pending += decoder.decode(chunk)
+        lines = pending.split("\n")
+        pending = lines.pop()
+        for line in lines:
+            yield line + "\n"
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending
+
+
+def _parse_csv_record(record: str) -> list:
+    return next(csv.reader(io.StringIO(record)))
+
+
+# Whether a quoted field is still open at the end of `line`, given whether
+# one was open at its start. Follows the csv module's default dialect: a
+# quote opens a quoted field only at the start of a field ("" inside one is
+# an escaped quote); elsewhere, as in 12" pipe, it is literal.
+def _in_quoted_field(line: str, quoted: bool) -> bool:
+    if '"' not in line:
+        return quoted
+    at_field_start, after_quote = not quoted, False
+    for char in line:
+        if quoted:
+            if after_quote:
+                after_quote = False
+                if char != '"':
+                    quoted = False
+                    at_field_start = char == ","
+                    continue
+            elif char == '"':
+                after_quote = True
+            continue
+        if char == '"' and at_field_start:
+            quoted = True
+        at_field_start = char in ",\r\n"
+    return quoted and not after_quote
+
+
+# (row number, dict or error message) per CSV record; the first record is
+# the header. Quoted fields may span lines, so lines are collected until no
+# quoted field is open, up to MAX_CSV_RECORD_CHARS per record.
+async def iter_csv_rows(lines):
+    header, record, row_number, quoted = None, "", 0, False
+    async for line in lines:
+        record += line
+        quoted = _in_quoted_field(line, quoted)
+        if quoted:
+            if len(record) > MAX_CSV_RECORD_CHARS:
+                row_number += 1
+                yield row_number, f"Unterminated quoted field (record longer than {MAX_CSV_RECORD_CHARS} characters)"
+                record, quoted = "", False
+            continue
+        if record.strip():
+            try:
+                values = _parse_csv_record(record)
+            except csv.Error as e:
+                values = e
+            if header is None:
+                if isinstance(values, Exception):
+                    raise ValueError(f"Unreadable CSV header: {values}")
+                header = [name.strip() for name in values]
+            else:
+                row_number += 1
+                if isinstance(values, Exception):
+                    yield row_number, str(values)
+                else:
+                    yield row_number, dict(zip(header, values))
+        record = ""
+    if record.strip():
+        yield row_number + 1, "Unterminated quoted field"
+
+
+async def iter_ndjson_rows(lines):
+    row_number = 0
+    async for line in lines:
+        if not line.strip():
+            continue
+        row_number += 1
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            yield row_number, f"Invalid JSON: {e}"
+            continue
+        yield row_number, row if isinstance(row, dict) else "Expected a JSON object"
+
+
+# Upserts on shipmentNumber; returns (inserted, updated, [(position in ops, message)])
+async def bulk_upsert_shipments(ops: list):
+    try:
+        result = await db.shipments.bulk_write(ops, ordered=False)
+        return result.upserted_count, result.matched_count, []
+    except BulkWriteError as e:
+        errors = [(err["index"], err.get("errmsg", "write failed")) for err in e.details.get("writeErrors", [])]
+        return e.details.get("nUpserted", 0), e.details.get("nMatched", 0), errors
+
+
+# Validates rows one at a time against Shipment and writes them in batches
+# of `batch_size`; memory stays bounded by the batch, not the file
+async def import_shipments(rows, created_by: str, write=bulk_upsert_shipments, batch_size: int = IMPORT_BATCH_SIZE):
+    report = {"rows": 0, "inserted": 0, "updated": 0, "failed": 0, "errors": []}
+
+    def add_error(row_number, message):
+        report["failed"] += 1
+        if len(report["errors"]) < MAX_REPORTED_ERRORS:
+            report["errors"].append({"row": row_number, "error": message})
+
+    async def flush(ops, row_numbers):
+        inserted, updated, errors = await write(ops)
+        report["inserted"] += inserted
+        report["updated"] += updated
+        for index, message in errors:
+            add_error(row_numbers[index], message)
+
+    ops, row_numbers = [], []
+    async for row_number, row in rows:
+        report["rows"] += 1
+        if isinstance(row, str):
+            add_error(row_number, row)
+            continue
+        try:
+            shipment = Shipment.model_validate(row)
+        except ValidationError as e:
+            add_error(row_number, "; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors()))
+            continue
+        data = shipment_document(shipment)
+        ops.append(UpdateOne({"shipmentNumber": data["shipmentNumber"]},
+                             {"$set": data, "$setOnInsert": {"createdBy": created_by}}, upsert=True))
+        row_numbers.append(row_number)
+        if len(ops) >= batch_size:
+            await flush(ops, row_numbers)
+            ops, row_numbers = [], []
+    if ops:
+        await flush(ops, row_numbers)
+    report["errors_truncated"] = report["failed"] > len(report["errors"])
+    return report
+
+
+# Export chunks, one per `batch_size` documents read from the cursor
+async def export_csv(cursor, batch_size: int = IMPORT_BATCH_SIZE):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=EXPORT_FIELDS, extrasaction="ignore")
+    writer.writeheader()
+    count = 0
+    async for doc in cursor:
+        writer.writerow(doc)
+        count += 1
+        if count % batch_size == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+async def export_ndjson(cursor, batch_size: int = IMPORT_BATCH_SIZE):
+    lines = []
+    async for doc in cursor:
+        lines.append(dumps_str({field: doc.get(field) for field in EXPORT_FIELDS}))
+        if len(lines) >= batch_size:
+            yield "\n".join(lines) + "\n"
+            lines = []
+    if lines:
+        yield "\n".join(lines) + "\n"
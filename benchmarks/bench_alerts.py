@@ -0,0 +1,102 @@
+# benchmarks/bench_alerts.py
+# Cost of evaluating alert rules on the ingest path. Feeds generated
+# readings (timestamps advancing at --rate readings/second) through an
+# AlertEngine in ingest-sized batches and reports per-reading cost, batch
+# latency percentiles, the share of one core rule evaluation would take at
+# --rate, and the memory held by per-device rule state.
+#
+#   python -m benchmarks.bench_alerts --devices 10000 --readings 1000000 --rate 10000
+import argparse
+import random
+import statistics
+import time
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+
+from bson import ObjectId
+from app.utils.alerts import AlertEngine
+
+GOODS = ("Pharma", "Food", "Electronics")
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def make_rules():
+    rules = [
+        {"name": "battery low", "metric": "battery_level", "op": "below", "threshold": 15, "clear_threshold": 20},
+        {"name": "temperature spike", "metric": "sensor_temperature", "op": "above", "threshold": 40},
+    ]
+    for goods, limit in zip(GOODS, (8, 5, 35)):
+        rules.append({"name": f"{goods} warm (10 min avg)", "metric": "sensor_temperature", "op": "above",
+                      "threshold": limit, "clear_threshold": limit - 1, "window_minutes": 10, "goodsType": goods})
+    rules.append({"name": "cold chain (30 min avg)", "metric": "sensor_temperature", "op": "above",
+                  "threshold": 6, "clear_threshold": 5, "window_minutes": 30, "goodsType": "Pharma"})
+    return [{**rule, "_id": ObjectId()} for rule in rules]
+
+
+def make_batches(devices, readings, rate, batch_size):
+    start = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    rng = random.Random(1)
+    temperature = [(4.0, 2.0, 20.0)[i % len(GOODS)] + rng.uniform(-1, 1) for i in range(devices)]
+    battery = [rng.uniform(10, 100) for _ in range(devices)]
+    batch = []
+    for n in range(readings):
+        i = rng.randrange(devices)
+        temperature[i] += rng.uniform(-0.2, 0.2)
+        battery[i] = max(0.0, battery[i] - rng.uniform(0, 0.01))
+        batch.append({"device_id": f"DEV{i:05d}", "sensor_temperature": temperature[i], "battery_level": battery[i],
+                      "route_from": "A", "route_to": "B", "timestamp": start + timedelta(seconds=n / rate)})
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def make_engine(devices):
+    engine = AlertEngine()
+    engine.set_rules(make_rules())
+    engine.set_device_goods({f"DEV{i:05d}": {GOODS[i % len(GOODS)]} for i in range(devices)})
+    return engine
+
+
+def main(args):
+    engine = make_engine(args.devices)
+    batch_times, events = [], 0
+    for batch in make_batches(args.devices, args.readings, args.rate, args.batch_size):
+        t0 = time.perf_counter()
+        events += len(engine.evaluate_many(batch))
+        batch_times.append(time.perf_counter() - t0)
+    elapsed = sum(batch_times)
+
+    # second, shorter pass under tracemalloc for the size of the rule state
+    sizing = make_engine(args.devices)
+    batches = list(make_batches(args.devices, min(args.readings, args.devices * 20), args.rate, args.batch_size))
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    for batch in batches:
+        sizing.evaluate_many(batch)
+    state_bytes = tracemalloc.get_traced_memory()[0] - baseline
+    tracemalloc.stop()
+
+    per_reading = elapsed / args.readings
+    print(f"devices={args.devices} rules={len(engine.rules)} readings={args.readings} batch_size={args.batch_size}")
+    print(f"evaluation: {per_reading * 1e6:.2f} us/reading, {args.readings / elapsed:,.0f} readings/s")
+    print(f"per batch: mean={statistics.mean(batch_times) * 1e3:.2f}ms p50={percentile(batch_times, 50) * 1e3:.2f}ms "
+          f"p99={percentile(batch_times, 99) * 1e3:.2f}ms")
+    print(f"at {args.rate:,} readings/s rule evaluation uses {per_reading * args.rate * 100:.1f}% of one core")
+    print(f"events={events} opened={engine.opened} resolved={engine.resolved} open={engine.open_alerts}")
+    print(f"rule state: {len(sizing.states)} (rule, device) pairs, {state_bytes / 2**20:.1f} MiB "
+          f"({state_bytes / max(1, len(sizing.states)):.0f} bytes each, including open alerts)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--devices", type=int, default=10000)
+    parser.add_argument("--readings", type=int, default=1_000_000)
+    parser.add_argument("--rate", type=int, default=10000, help="simulated ingest rate, readings/second")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    main(parser.parse_args())
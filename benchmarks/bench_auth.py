@@ -0,0 +1,58 @@
+# benchmarks/bench_auth.py
+# Per-request cost of authentication with and without the verified-token
+# cache: verify_token on its own, and GET /auth/me end to end (cookie auth
+# through get_current_user). Token-version checks are turned off so no
+# database is needed.
+#
+#   python -m benchmarks.bench_auth --requests 5000
+import argparse
+import asyncio
+import os
+import time
+
+os.environ.setdefault("JWT_SECRET", "bench-secret")
+os.environ.setdefault("JWT_ALGORITHM", "HS256")
+os.environ["TOKEN_REVOCATION"] = "false"
+
+import httpx
+from app.main import app
+from app.utils import auth
+
+
+def time_verify(token, n):
+    started = time.perf_counter()
+    for _ in range(n):
+        assert auth.verify_token(token) is not None
+    return (time.perf_counter() - started) / n
+
+
+async def time_route(token, n):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench",
+                                 cookies={"access_token": token}) as client:
+        started = time.perf_counter()
+        for _ in range(n):
+            r = await client.get("/auth/me")
+            r.raise_for_status()
+        return (time.perf_counter() - started) / n
+
+
+async def main(args):
+    token = auth.create_access_token({"sub": "bench", "role": "admin", "ver": 0})
+    results = {}
+    for label, size in (("no cache", 0), ("cache", auth.TOKEN_CACHE_SIZE or 10000)):
+        auth.token_cache.maxsize = size
+        auth.token_cache.clear()
+        results[label] = (time_verify(token, args.requests), await time_route(token, args.requests))
+
+    print(f"requests={args.requests}")
+    for label, (verify, route) in results.items():
+        print(f"{label:9s} verify_token={verify * 1e6:8.1f}us  GET /auth/me={route * 1e6:8.1f}us")
+    saved = results["no cache"][0] - results["cache"][0]
+    print(f"auth overhead saved per request: {saved * 1e6:.1f}us")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=5000)
+    asyncio.run(main(parser.parse_args()))
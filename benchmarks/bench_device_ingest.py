@@ -0,0 +1,86 @@
+# benchmarks/bench_device_ingest.py
+# Compares POST /device/device-data (one insert per reading) with
+# POST /device/device-data/batch against the database in MONGO_URI.
+# Writes go to a scratch database (MONGO_DB, default scm_bench) that is
+# dropped afterwards.
+#
+#   python -m benchmarks.bench_device_ingest --readings 20000 --batch-size 500
+import argparse
+import asyncio
+import os
+import random
+import time
+from datetime import datetime, timedelta
+
+os.environ.setdefault("MONGO_DB", "scm_bench")
+
+import httpx
+from app.main import app
+from app.db.mongodb import db
+from app.utils.rbac import is_admin
+
+app.dependency_overrides[is_admin] = lambda: {"sub": "bench", "role": "admin"}
+
+
+def make_readings(n: int):
+    start = datetime(2024, 1, 1)
+    return [{
+        "device_id": f"DEV{random.randint(1, 200):04d}",
+        "battery_level": round(random.uniform(5, 100), 1),
+        "sensor_temperature": round(random.uniform(-20, 40), 1),
+        "route_from": "Chennai",
+        "route_to": "Mumbai",
+        "timestamp": (start + timedelta(seconds=i)).isoformat(),
+    } for i in range(n)]
+
+
+async def run_single(client, readings, concurrency):
+    sem = asyncio.Semaphore(concurrency)
+
+    async def post(reading):
+        async with sem:
+            r = await client.post("/device/device-data", json=reading)
+            r.raise_for_status()
+
+    await asyncio.gather(*(post(r) for r in readings))
+
+
+async def run_batch(client, readings, batch_size, concurrency):
+    sem = asyncio.Semaphore(concurrency)
+
+    async def post(chunk):
+        async with sem:
+            r = await client.post("/device/device-data/batch", json=chunk)
+            r.raise_for_status()
+
+    chunks = [readings[i:i + batch_size] for i in range(0, len(readings), batch_size)]
+    await asyncio.gather(*(post(c) for c in chunks))
+
+
+async def main(args):
+    readings = make_readings(args.readings)
+    transport = httpx.ASGITransport(app=app)
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            await db.device_data.delete_many({})
+            started = time.perf_counter()
+            await run_single(client, readings, args.concurrency)
+            single = time.perf_counter() - started
+
+            await db.device_data.delete_many({})
+            started = time.perf_counter()
+            await run_batch(client, readings, args.batch_size, args.concurrency)
+            batch = time.perf_counter() - started
+    await db.client.drop_database(db.name)
+
+    print(f"readings={args.readings} concurrency={args.concurrency}")
+    print(f"single insert : {single:8.2f}s {args.readings / single:10.0f} readings/s")
+    print(f"batch ({args.batch_size:>5}) : {batch:8.2f}s {args.readings / batch:10.0f} readings/s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--readings", type=int, default=20000)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=20)
+    asyncio.run(main(parser.parse_args()))
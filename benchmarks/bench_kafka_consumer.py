@@ -0,0 +1,74 @@
+# benchmarks/bench_kafka_consumer.py
+# Messages per second through DeviceConsumer for a range of batch sizes, fed
+# from the in-process MemoryBroker. By default batches go to a sink that
+# simulates Mongo latency (fixed cost per round trip + cost per document);
+# --mongo writes through insert_readings to the database in MONGO_URI
+# (scratch database MONGO_DB, default scm_bench, dropped afterwards).
+#
+#   python -m benchmarks.bench_kafka_consumer --messages 50000 --batch-sizes 1,10,100,500,1000
+import argparse
+import asyncio
+import json
+import os
+import time
+
+os.environ.setdefault("MONGO_DB", "scm_bench")
+
+from app.consumers.memory_broker import MemoryBroker
+from app.consumers.device_consumer import DeviceConsumer
+
+
+def fill(broker, n):
+    for i in range(n):
+        broker.produce("device_data", json.dumps({
+            "device_id": f"DEV{i % 100:04d}", "battery_level": 80.0, "sensor_temperature": 4.5,
+            "route_from": "Chennai", "route_to": "Mumbai", "timestamp": "2024-01-01T00:00:00",
+        }).encode(), key=str(i % 100).encode())
+
+
+def simulated_sink(round_trip, per_doc):
+    async def sink(docs):
+        await asyncio.sleep(round_trip + per_doc * len(docs))
+        return len(docs), []
+    return sink
+
+
+async def run_once(args, batch_size):
+    broker = MemoryBroker(partitions=args.partitions)
+    fill(broker, args.messages)
+    if args.mongo:
+        from app.db.device_store import insert_readings
+        sink = insert_readings
+    else:
+        sink = simulated_sink(args.round_trip_ms / 1000, args.per_doc_us / 1e6)
+    consumer = DeviceConsumer(broker.consumer("device_data"), sink=sink,
+                              batch_size=batch_size, batch_seconds=0.05)
+    started = time.perf_counter()
+    consumer.start()
+    while consumer.stats.written < args.messages:
+        await asyncio.sleep(0.01)
+    elapsed = time.perf_counter() - started
+    await consumer.stop()
+    return elapsed, consumer.stats
+
+
+async def main(args):
+    print(f"messages={args.messages} partitions={args.partitions} sink={'mongo' if args.mongo else 'simulated'}")
+    for batch_size in [int(b) for b in args.batch_sizes.split(",")]:
+        elapsed, stats = await run_once(args, batch_size)
+        print(f"batch_size={batch_size:6d} {args.messages / elapsed:10.0f} msg/s "
+              f"batches={stats.batches:6d} paused={stats.paused:5d}")
+    if args.mongo:
+        from app.db.mongodb import db
+        await db.client.drop_database(db.name)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=50000)
+    parser.add_argument("--partitions", type=int, default=4)
+    parser.add_argument("--batch-sizes", default="1,10,100,500,1000")
+    parser.add_argument("--round-trip-ms", type=float, default=2.0)
+    parser.add_argument("--per-doc-us", type=float, default=5.0)
+    parser.add_argument("--mongo", action="store_true")
+    asyncio.run(main(parser.parse_args()))
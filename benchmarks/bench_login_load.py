@@ -0,0 +1,78 @@
+# benchmarks/bench_login_load.py
+# Latency of an unrelated endpoint (GET /auth/login) while a burst of
+# concurrent POST /auth/token logins runs, for each password hashing mode.
+# Uses the database in MONGO_URI (scratch database MONGO_DB, default
+# scm_bench, dropped afterwards).
+#
+#   python -m benchmarks.bench_login_load --logins 100 --modes inline,thread
+import argparse
+import asyncio
+import os
+import time
+
+os.environ.setdefault("MONGO_DB", "scm_bench")
+os.environ.setdefault("JWT_SECRET", "bench-secret")
+os.environ.setdefault("JWT_ALGORITHM", "HS256")
+
+import httpx
+from app.main import app
+from app.db.mongodb import db
+from app.utils import passwords
+
+PASSWORD = "Bench#Passw0rd"
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+# Latency is measured from when the probe was due, so time the request spent
+# waiting for a blocked event loop counts against it
+async def probe(client, latencies, stop, interval=0.005):
+    due = time.perf_counter()
+    while not stop.is_set():
+        r = await client.get("/auth/login")
+        r.raise_for_status()
+        latencies.append(time.perf_counter() - due)
+        due = time.perf_counter() + interval
+        await asyncio.sleep(interval)
+
+
+async def run_mode(client, mode, logins):
+    passwords.password_pool.shutdown()
+    passwords.password_pool = passwords.PasswordPool(mode=mode, max_queue=max(logins, 256))
+    latencies, stop = [], asyncio.Event()
+    prober = asyncio.create_task(probe(client, latencies, stop))
+    await asyncio.sleep(0.1)
+    started = time.perf_counter()
+    responses = await asyncio.gather(*(
+        client.post("/auth/token", data={"username": "bench", "password": PASSWORD})
+        for _ in range(logins)))
+    burst = time.perf_counter() - started
+    stop.set()
+    await prober
+    assert all(r.status_code == 200 for r in responses), responses[0].text
+    return burst, latencies
+
+
+async def main(args):
+    await db.users.delete_many({"username": "bench"})
+    await db.users.insert_one({"username": "bench", "email": "bench@example.com",
+                               "password": passwords.pwd_context.hash(PASSWORD), "role": "admin"})
+    transport = httpx.ASGITransport(app=app)
+    print(f"logins={args.logins} workers={passwords.PASSWORD_HASH_WORKERS}")
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for mode in args.modes.split(","):
+            burst, latencies = await run_mode(client, mode, args.logins)
+            print(f"{mode:8s} burst={burst:6.2f}s probes={len(latencies):5d} "
+                  f"p50={percentile(latencies, 50) * 1e3:8.1f}ms p99={percentile(latencies, 99) * 1e3:8.1f}ms "
+                  f"max={max(latencies) * 1e3:8.1f}ms")
+    await db.client.drop_database(db.name)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--logins", type=int, default=100)
+    parser.add_argument("--modes", default="inline,thread,process")
+    asyncio.run(main(parser.parse_args()))
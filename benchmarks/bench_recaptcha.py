@@ -0,0 +1,50 @@
+# benchmarks/bench_recaptcha.py
+# Cost of reCAPTCHA verification per login: a fresh httpx client per call
+# (the old login handler) against the pooled RecaptchaVerifier, both talking
+# to the local stub server over TCP. Start the stub first:
+#
+#   python -m benchmarks.stub_recaptcha --port 9010
+#   python -m benchmarks.bench_recaptcha --url http://127.0.0.1:9010/recaptcha/api/siteverify
+import argparse
+import asyncio
+import time
+import httpx
+from app.utils.recaptcha import RecaptchaVerifier
+
+
+async def fresh_client(url, n):
+    started = time.perf_counter()
+    for i in range(n):
+        async with httpx.AsyncClient() as client:
+            r = await client.post(url, data={"secret": "s", "response": f"token-{i}"})
+            assert r.json()["success"]
+    return (time.perf_counter() - started) / n
+
+
+async def pooled(url, n, duplicate_share):
+    verifier = RecaptchaVerifier(url=url)
+    await verifier.start()
+    started = time.perf_counter()
+    for i in range(n):
+        # a share of logins resubmit the previous token (double clicks)
+        token = f"token-{i - 1 if i and i % int(1 / duplicate_share) == 0 else i}" if duplicate_share else f"token-{i}"
+        assert await verifier.verify("s", token)
+    elapsed = (time.perf_counter() - started) / n
+    await verifier.close()
+    return elapsed, verifier.stats()
+
+
+async def main(args):
+    fresh = await fresh_client(args.url, args.logins)
+    pool, stats = await pooled(args.url, args.logins, args.duplicate_share)
+    print(f"logins={args.logins}")
+    print(f"fresh client per login : {fresh * 1e3:8.2f}ms")
+    print(f"pooled verifier        : {pool * 1e3:8.2f}ms  {stats}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default="http://127.0.0.1:9010/recaptcha/api/siteverify")
+    parser.add_argument("--logins", type=int, default=500)
+    parser.add_argument("--duplicate-share", type=float, default=0.1)
+    asyncio.run(main(parser.parse_args()))
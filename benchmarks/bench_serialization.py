@@ -0,0 +1,124 @@
+# benchmarks/bench_serialization.py
+# Cost of turning a page of Mongo documents into a JSON response, for the
+# shipment listing and device readings APIs. Each payload is served by a
+# small FastAPI app in this process (no network, no database; the handler
+# gets shallow copies of pre-built documents, as a cursor would hand them
+# over) in two ways:
+#   before  str() every ObjectId, return the list; FastAPI revalidates it
+#           against response_model, runs jsonable_encoder and json.dumps
+#   after   return ORJSONResponse(docs) as the routes now do
+# Also reports the encoder alone (json.dumps vs orjson) and payload sizes.
+#
+#   python -m benchmarks.bench_serialization --rows 10000
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from typing import List
+
+import httpx
+from bson import ObjectId
+from fastapi import FastAPI
+
+from app.db.shipment_store import LIST_PROJECTION
+from app.models.device_models import DeviceReading
+from app.models.shipment_models import ShipmentSummary
+from app.utils.serialization import ORJSONResponse, dumps
+from benchmarks.datagen import readings, shipments
+
+
+def shipment_docs(rows):
+    return [{"_id": ObjectId(), **{field: doc[field] for field in LIST_PROJECTION}}
+            for doc in shipments(rows, devices=1000, users_count=100)]
+
+
+# Motor hands back naive UTC datetimes
+def reading_docs(rows):
+    return [{**doc, "timestamp": doc["timestamp"].replace(tzinfo=None), "_id": ObjectId()}
+            for doc in readings(rows, devices=1000)]
+
+
+def make_app(shipment_rows, reading_rows):
+    app = FastAPI()
+
+    @app.get("/before/shipments", response_model=List[ShipmentSummary])
+    async def shipments_before():
+        docs = [dict(doc) for doc in shipment_rows]
+        for doc in docs:
+            doc["id"] = str(doc.pop("_id"))
+        return docs
+
+    @app.get("/after/shipments", response_model=List[ShipmentSummary])
+    async def shipments_after():
+        docs = [dict(doc) for doc in shipment_rows]
+        for doc in docs:
+            doc["id"] = doc.pop("_id")
+        return ORJSONResponse(docs)
+
+    @app.get("/before/readings")
+    async def readings_before():
+        docs = [dict(doc) for doc in reading_rows]
+        for doc in docs:
+            doc["_id"] = str(doc["_id"])
+        return docs
+
+    @app.get("/after/readings", response_model=List[DeviceReading])
+    async def readings_after():
+        return ORJSONResponse([dict(doc) for doc in reading_rows])
+
+    return app
+
+
+async def time_requests(app, path, repeat):
+    timings, size = [], 0
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        await client.get(path)
+        for _ in range(repeat):
+            started = time.perf_counter()
+            reply = await client.get(path)
+            timings.append(time.perf_counter() - started)
+            size = len(reply.content)
+    return timings, size
+
+
+def time_encoder(encode, docs, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        encode(docs)
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings)
+
+
+def _json_default(value):
+    return value.isoformat() if hasattr(value, "isoformat") else str(value)
+
+
+async def main(args):
+    payloads = {"shipments": shipment_docs(args.rows), "readings": reading_docs(args.rows)}
+    app = make_app(payloads["shipments"], payloads["readings"])
+    print(f"{args.rows} rows, median of {args.repeat} requests")
+    print(f"{'payload':10} {'mode':7} {'request ms':>11} {'per row us':>11} {'bytes':>10}")
+    for payload in payloads:
+        results = {}
+        for mode in ("before", "after"):
+            timings, size = await time_requests(app, f"/{mode}/{payload}", args.repeat)
+            results[mode] = statistics.median(timings)
+            print(f"{payload:10} {mode:7} {results[mode] * 1000:11.1f} {results[mode] / args.rows * 1e6:11.2f} "
+                  f"{size:10}")
+        print(f"{payload:10} speedup {results['before'] / results['after']:.1f}x")
+
+    print("\nencoder only (ms)")
+    for payload, docs in payloads.items():
+        stdlib = time_encoder(lambda d: json.dumps(d, default=_json_default), docs, args.repeat)
+        fast = time_encoder(dumps, docs, args.repeat)
+        print(f"{payload:10} json {stdlib * 1000:7.1f}  orjson {fast * 1000:7.1f}  ({stdlib / fast:.1f}x)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=20)
+    asyncio.run(main(parser.parse_args()))
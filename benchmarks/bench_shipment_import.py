@@ -0,0 +1,91 @@
+# benchmarks/bench_shipment_import.py
+# Rows per second and peak memory of the streaming shipment import for a
+# generated file (1M rows by default), fed in 64 KiB chunks the way the
+# request body arrives. Writes go to a no-op sink unless --mongo is given,
+# in which case they are upserted into MONGO_URI (scratch database MONGO_DB,
+# default scm_bench, dropped afterwards).
+#
+#   python -m benchmarks.bench_shipment_import --rows 1000000 --format csv
+import argparse
+import asyncio
+import json
+import os
+import resource
+import time
+import tracemalloc
+
+os.environ.setdefault("MONGO_DB", "scm_bench")
+
+from app.models.shipment_models import Shipment
+from app.utils.shipment_io import iter_lines, iter_csv_rows, iter_ndjson_rows, import_shipments
+
+FIELDS = list(Shipment.model_fields)
+CHUNK_SIZE = 64 * 1024
+
+
+def make_row(i):
+    return {
+        "shipmentNumber": f"SHP{i:08d}", "routeDetails": "Chennai-Mumbai", "device": f"DEV{i % 500:04d}",
+        "poNumber": f"PO{i:08d}", "ndcNumber": f"NDC{i % 1000}", "serialNumberOfGoods": f"SN{i}",
+        "containerNumber": f"CONT{i % 200}", "goodsType": ("Pharma", "Food", "Electronics")[i % 3],
+        "expectedDeliveryDate": f"2025-{i % 12 + 1:02d}-{i % 28 + 1:02d}", "deliveryNumber": f"DN{i}",
+        "batchNumber": f"B{i % 5000}", "shipmentDescription": f"Order {i}, temperature controlled",
+    }
+
+
+async def generate(rows, fmt):
+    buffer = []
+    size = 0
+    if fmt == "csv":
+        buffer.append(",".join(FIELDS) + "\n")
+    for i in range(rows):
+        row = make_row(i)
+        if fmt == "csv":
+            line = ",".join(f'"{v}"' if "," in v else v for v in row.values()) + "\n"
+        else:
+            line = json.dumps(row) + "\n"
+        buffer.append(line)
+        size += len(line)
+        if size >= CHUNK_SIZE:
+            yield "".join(buffer).encode()
+            buffer, size = [], 0
+    if buffer:
+        yield "".join(buffer).encode()
+
+
+async def null_sink(ops):
+    return len(ops), 0, []
+
+
+async def main(args):
+    if args.trace_memory:
+        tracemalloc.start()
+    lines = iter_lines(generate(args.rows, args.format))
+    rows = iter_csv_rows(lines) if args.format == "csv" else iter_ndjson_rows(lines)
+    write = null_sink
+    if args.mongo:
+        from app.utils.shipment_io import bulk_upsert_shipments
+        write = bulk_upsert_shipments
+    started = time.perf_counter()
+    report = await import_shipments(rows, "bench", write=write, batch_size=args.batch_size)
+    elapsed = time.perf_counter() - started
+
+    print(f"rows={report['rows']} format={args.format} sink={'mongo' if args.mongo else 'null'} "
+          f"batch_size={args.batch_size}")
+    print(f"elapsed={elapsed:.1f}s  {report['rows'] / elapsed:,.0f} rows/s  failed={report['failed']}")
+    if args.trace_memory:
+        print(f"peak traced memory={tracemalloc.get_traced_memory()[1] / 2**20:.1f} MiB")
+    print(f"max RSS={resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.1f} MiB")
+    if args.mongo:
+        from app.db.mongodb import db
+        await db.client.drop_database(db.name)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--format", choices=["csv", "ndjson"], default="csv")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--mongo", action="store_true")
+    parser.add_argument("--trace-memory", action="store_true", help="report tracemalloc peak (slower)")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,118 @@
+# benchmarks/bench_templates.py
+# Template cost for a cold worker and per request. Each startup case runs in
+# a fresh interpreter, the way a new uvicorn worker starts:
+#   separate     one Jinja2Templates per router, no bytecode cache (before)
+#   shared-cold  the shared environment with an empty bytecode cache
+#   shared-warm  the shared environment with the cache written at build time
+# and reports the time to import the templates module, compile every
+# template, and render the first device data page. Then, in this process,
+# compares a full render of the large tables with the time to the first
+# streamed chunk.
+#
+#   python -m benchmarks.bench_templates --rows 5000
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+
+def device_page_context(rows):
+    now = datetime.now(timezone.utc)
+    data = [{"device_id": f"DEV{i % 50:03d}", "battery_level": 80.5, "sensor_temperature": 4.2,
+             "route_from": "Chennai", "route_to": "Mumbai", "timestamp": now} for i in range(rows)]
+    summaries = [{"device_id": f"DEV{i:03d}", "count": 100,
+                  "battery_level": {"min": 70, "avg": 80.0, "max": 90},
+                  "sensor_temperature": {"min": 2, "avg": 4.0, "max": 6}} for i in range(50)]
+    return {"device_data": data, "summaries": summaries, "hours": 24,
+            "all_devices": [s["device_id"] for s in summaries], "selected_device": None}
+
+
+def shipments_page_context(rows):
+    shipments = [{"_id": f"{i:024x}", "shipmentNumber": f"SHP{i:08d}", "routeDetails": "Chennai-Mumbai",
+                  "device": f"DEV{i % 50:03d}", "goodsType": "Pharma", "expectedDeliveryDate": "2025-06-01",
+                  "createdBy": "admin"} for i in range(rows)]
+    return {"shipments": shipments, "next_url": None, "params": {}}
+
+
+def child(mode, rows):
+    started = time.perf_counter()
+    if mode == "separate":
+        from fastapi.templating import Jinja2Templates
+        routers = [Jinja2Templates(directory="app/templates") for _ in range(5)]
+        imported = time.perf_counter()
+        for templates in routers:
+            for name in templates.env.list_templates(extensions=["html"]):
+                templates.env.get_template(name)
+        env = routers[0].env
+    else:
+        from app.templates import env, precompile_templates
+        imported = time.perf_counter()
+        precompile_templates()
+    compiled = time.perf_counter()
+    env.get_template("device_data.html").render(device_page_context(rows))
+    rendered = time.perf_counter()
+    print(json.dumps({"import": imported - started, "compile": compiled - imported, "first_render": rendered - compiled}))
+
+
+def run_child(mode, rows, bytecode_dir):
+    environ = {**os.environ, "TEMPLATE_BYTECODE_DIR": bytecode_dir, "TEMPLATE_AUTO_RELOAD": "false"}
+    out = subprocess.run([sys.executable, "-m", "benchmarks.bench_templates", "--child", mode, "--rows", str(rows)],
+                         env=environ, capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def startup(args):
+    print(f"cold worker, median of {args.runs} runs (ms):")
+    print(f"{'case':<12} {'import':>8} {'compile':>8} {'1st render':>10} {'total':>8}")
+    for mode in ("separate", "shared-cold", "shared-warm"):
+        results = []
+        with tempfile.TemporaryDirectory() as bytecode_dir:
+            if mode == "shared-warm":
+                subprocess.run([sys.executable, "-m", "app.templates"], check=True, capture_output=True,
+                               env={**os.environ, "TEMPLATE_BYTECODE_DIR": bytecode_dir})
+            for _ in range(args.runs):
+                if mode == "shared-cold":
+                    for name in os.listdir(bytecode_dir):
+                        os.remove(os.path.join(bytecode_dir, name))
+                results.append(run_child(mode, args.rows, bytecode_dir if mode != "separate" else ""))
+        row = {key: statistics.median(r[key] for r in results) * 1000 for key in results[0]}
+        print(f"{mode:<12} {row['import']:>8.1f} {row['compile']:>8.1f} {row['first_render']:>10.1f} "
+              f"{sum(row.values()):>8.1f}")
+
+
+def rendering(args):
+    from app.templates import env, _chunks
+    print(f"\nrender, {args.rows} rows, median of {args.runs} runs (ms):")
+    print(f"{'page':<22} {'full render':>11} {'first chunk':>11} {'chunks':>7}")
+    for name, context in (("device_data.html", device_page_context(args.rows)),
+                          ("manage_shipments.html", shipments_page_context(args.rows))):
+        template = env.get_template(name)
+        full, first, chunks = [], [], 0
+        for _ in range(args.runs):
+            started = time.perf_counter()
+            template.render(context)
+            full.append(time.perf_counter() - started)
+            started = time.perf_counter()
+            stream = _chunks(template, context)
+            next(stream)
+            first.append(time.perf_counter() - started)
+            chunks = 1 + sum(1 for _ in stream)
+        print(f"{name:<22} {statistics.median(full) * 1000:>11.2f} {statistics.median(first) * 1000:>11.2f} {chunks:>7}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--child", choices=["separate", "shared-cold", "shared-warm"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        child(args.child, args.rows)
+    else:
+        startup(args)
+        rendering(args)
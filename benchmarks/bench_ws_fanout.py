@@ -0,0 +1,72 @@
+# benchmarks/bench_ws_fanout.py
+# Fan-out latency of the in-process DeviceHub: N subscribers (a share of them
+# filtered to one device, a share of them deliberately slow) receive every
+# published reading; reports publish cost and publish-to-delivery latency.
+#
+#   python -m benchmarks.bench_ws_fanout --subscribers 5000 --messages 200
+import argparse
+import asyncio
+import json
+import statistics
+import time
+
+from app.utils.device_hub import DeviceHub
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+async def client(subscriber, latencies, slow_delay):
+    while True:
+        for message in await subscriber.next_batch():
+            latencies.append(time.perf_counter() - json.loads(message)["sent"])
+            if slow_delay:
+                await asyncio.sleep(slow_delay)
+            else:
+                await asyncio.sleep(0)  # stands in for the socket write
+
+
+async def main(args):
+    hub = DeviceHub()
+    fast, slow = [], []
+    tasks = []
+    for i in range(args.subscribers):
+        device_ids = [f"DEV{i % args.devices}"] if i % 2 else None
+        subscriber = hub.subscribe(device_ids, args.queue_size, args.policy)
+        is_slow = i < args.subscribers * args.slow_share
+        tasks.append(asyncio.create_task(
+            client(subscriber, slow if is_slow else fast, args.slow_delay if is_slow else 0)))
+
+    publish_times = []
+    for n in range(args.messages):
+        started = time.perf_counter()
+        hub.publish({"device_id": f"DEV{n % args.devices}", "sent": started})
+        publish_times.append(time.perf_counter() - started)
+        await asyncio.sleep(args.interval)
+    await asyncio.sleep(0.5)
+    for task in tasks:
+        task.cancel()
+
+    dropped = sum(s.dropped for s in hub.all_devices) + sum(
+        s.dropped for subs in hub.by_device.values() for s in subs)
+    print(f"subscribers={args.subscribers} messages={args.messages} policy={args.policy}")
+    print(f"publish      mean={statistics.mean(publish_times) * 1e3:8.3f}ms p99={percentile(publish_times, 99) * 1e3:8.3f}ms")
+    print(f"fast clients deliveries={len(fast):8d} p50={percentile(fast, 50) * 1e3:8.3f}ms "
+          f"p99={percentile(fast, 99) * 1e3:8.3f}ms")
+    if slow:
+        print(f"slow clients deliveries={len(slow):8d} dropped={dropped}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--subscribers", type=int, default=5000)
+    parser.add_argument("--devices", type=int, default=50)
+    parser.add_argument("--messages", type=int, default=200)
+    parser.add_argument("--interval", type=float, default=0.005, help="seconds between publishes")
+    parser.add_argument("--queue-size", type=int, default=100)
+    parser.add_argument("--policy", choices=["drop", "coalesce"], default="drop")
+    parser.add_argument("--slow-share", type=float, default=0.05, help="fraction of slow clients")
+    parser.add_argument("--slow-delay", type=float, default=0.2, help="seconds a slow client spends per message")
+    asyncio.run(main(parser.parse_args()))
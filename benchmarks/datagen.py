@@ -0,0 +1,143 @@
+# benchmarks/datagen.py
+# Seeded synthetic data: users, shipments linked to devices, and device
+# readings. The same seed always yields the same data, so benchmark runs
+# are comparable. Generators are lazy; millions of readings stream through
+# without being held in memory.
+#
+#   python -m benchmarks.datagen --readings 2000000 --out /tmp/scm-data      # NDJSON files
+#   python -m benchmarks.datagen --readings 2000000 --mongo                  # into MONGO_URI / MONGO_DB
+#
+# --mongo writes to MONGO_DB=scm_bench unless MONGO_DB is set in the
+# environment, never to the app's database from .env: it creates an admin
+# user00000 with the known PASSWORD.
+import argparse
+import asyncio
+import json
+import os
+import random
+import time
+from datetime import datetime, timedelta, timezone
+
+GOODS = ("Pharma", "Food", "Electronics", "Chemicals")
+ROUTES = (("Chennai", "Mumbai"), ("Delhi", "Kolkata"), ("Pune", "Hyderabad"), ("Bengaluru", "Ahmedabad"))
+PASSWORD = "Bench#Passw0rd"
+START = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+
+def device_id(i: int) -> str:
+    return f"DEV{i:05d}"
+
+
+def username(i: int) -> str:
+    return f"user{i:05d}"
+
+
+# user00000 is an admin, the rest are users; all share PASSWORD so it is hashed once
+def users(n: int, password_hash: str):
+    for i in range(n):
+        yield {"username": username(i), "email": f"{username(i)}@example.com", "password": password_hash,
+               "role": "admin" if i == 0 else "user"}
+
+
+def shipments(n: int, devices: int, users_count: int = 1, seed: int = 1):
+    rng = random.Random(seed)
+    for i in range(n):
+        route = ROUTES[i % len(ROUTES)]
+        device = device_id(i % devices)
+        yield {
+            "shipmentNumber": f"SHP{i:08d}", "routeDetails": f"{route[0]}-{route[1]}", "device": device,
+            "deviceIds": [device], "poNumber": f"PO{i:08d}", "ndcNumber": f"NDC{rng.randrange(1000)}",
+            "serialNumberOfGoods": f"SN{i}", "containerNumber": f"CONT{rng.randrange(500)}",
+            "goodsType": GOODS[i % len(GOODS)],
+            "expectedDeliveryDate": (START + timedelta(days=rng.randrange(365))).strftime("%Y-%m-%d"),
+            "deliveryNumber": f"DN{i}", "batchNumber": f"B{rng.randrange(5000)}",
+            "shipmentDescription": f"Order {i} of {GOODS[i % len(GOODS)].lower()}, temperature controlled",
+            "createdBy": username(rng.randrange(users_count)),
+        }
+
+
+# Readings for `devices` devices in round-robin order, `rate` readings per
+# second of simulated time starting at `start`; values random-walk per device
+def readings(n: int, devices: int, seed: int = 1, start: datetime = START, rate: float = 100.0):
+    rng = random.Random(seed)
+    temperature = [rng.uniform(2, 8) for _ in range(devices)]
+    battery = [rng.uniform(60, 100) for _ in range(devices)]
+    for k in range(n):
+        i = k % devices
+        temperature[i] += rng.uniform(-0.3, 0.3)
+        battery[i] = max(0.0, battery[i] - rng.uniform(0, 0.02))
+        route = ROUTES[i % len(ROUTES)]
+        yield {"device_id": device_id(i), "battery_level": round(battery[i], 2),
+               "sensor_temperature": round(temperature[i], 2), "route_from": route[0], "route_to": route[1],
+               "timestamp": start + timedelta(seconds=k / rate)}
+
+
+def batched(items, size: int):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+# Loads the data through the app's own write paths, so rollups and the
+# latest-reading collection are populated the same way ingest does it
+async def seed_database(users_count: int, shipments_count: int, readings_count: int, devices: int,
+                        seed: int = 1, batch_size: int = 5000, readings_start: datetime = START):
+    from app.db.mongodb import db
+    from app.db.device_store import ensure_device_storage, insert_readings
+    from app.db.indexes import ensure_indexes
+    from app.utils.passwords import pwd_context
+
+    await ensure_device_storage()
+    await ensure_indexes()
+    password_hash = pwd_context.hash(PASSWORD)
+    for batch in batched(users(users_count, password_hash), batch_size):
+        await db.users.insert_many(batch, ordered=False)
+    for batch in batched(shipments(shipments_count, devices, users_count, seed), batch_size):
+        await db.shipments.insert_many(batch, ordered=False)
+    for batch in batched(readings(readings_count, devices, seed, readings_start), batch_size):
+        await insert_readings(batch)
+
+
+def _json_default(value):
+    return value.isoformat()
+
+
+def write_files(out: str, users_count: int, shipments_count: int, readings_count: int, devices: int, seed: int):
+    from app.utils.passwords import pwd_context
+    os.makedirs(out, exist_ok=True)
+    sets = {
+        "users": users(users_count, pwd_context.hash(PASSWORD)),
+        "shipments": shipments(shipments_count, devices, users_count, seed),
+        "readings": readings(readings_count, devices, seed),
+    }
+    for name, docs in sets.items():
+        with open(os.path.join(out, f"{name}.ndjson"), "w") as f:
+            for doc in docs:
+                f.write(json.dumps(doc, default=_json_default) + "\n")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--shipments", type=int, default=100_000)
+    parser.add_argument("--readings", type=int, default=1_000_000)
+    parser.add_argument("--devices", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=1)
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--out", help="directory for users/shipments/readings .ndjson files")
+    target.add_argument("--mongo", action="store_true", help="insert into MONGO_URI / MONGO_DB")
+    args = parser.parse_args()
+    started = time.perf_counter()
+    if args.mongo:
+        # before app.db.mongodb loads .env, so its MONGO_DB doesn't apply
+        os.environ.setdefault("MONGO_DB", "scm_bench")
+        asyncio.run(seed_database(args.users, args.shipments, args.readings, args.devices, args.seed))
+    else:
+        write_files(args.out, args.users, args.shipments, args.readings, args.devices, args.seed)
+    print(f"generated {args.users} users, {args.shipments} shipments, {args.readings} readings "
+          f"in {time.perf_counter() - started:.1f}s")
@@ -0,0 +1,367 @@
+# benchmarks/loadtest.py
+# End-to-end load test. Serves the app with uvicorn in this process, on a
+# Mongo stand-in (see mongo_standin.py) seeded with benchmarks.datagen and
+# with the reCAPTCHA stub in place of Google. Then runs scripted scenarios
+# over real HTTP and WebSocket connections:
+#   login     login storm through the HTML form: reCAPTCHA, bcrypt, token
+#   ingest    telemetry batches posted to /device/device-data/batch
+#   browse    dashboard, listing and device pages as an admin clicks around
+#   fanout    WebSocket subscribers receiving readings while they are ingested
+# Each scenario reports RPS, p50/p95/p99 latency and peak RSS. Results are
+# written to benchmarks/results/<label>.json; --compare flags regressions
+# against an earlier file.
+#
+#   python -m benchmarks.loadtest --mongo memory --duration 10 --label baseline
+#   python -m benchmarks.loadtest --mongo memory --compare benchmarks/results/baseline.json
+#
+# Client and server share one process and core, so absolute numbers are
+# lower than a deployed worker's; compare runs made the same way.
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import resource
+import socket
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from urllib.parse import urlencode
+
+import httpx
+from benchmarks import mongo_standin
+
+SCENARIOS = ("login", "ingest", "browse", "fanout")
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+# A change is a regression when throughput drops or p95 latency grows by more than this
+REGRESSION_THRESHOLD = 0.10
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _rss_bytes() -> int:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        # no /proc: fall back to the process-lifetime peak
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies = []
+        self.errors = 0
+        self.items = 0
+        self.peak_rss = _rss_bytes()
+        self.started = self.finished = None
+
+    async def sample_memory(self):
+        while True:
+            self.peak_rss = max(self.peak_rss, _rss_bytes())
+            await asyncio.sleep(0.1)
+
+    def result(self, extra: dict = None) -> dict:
+        elapsed = self.finished - self.started
+        out = {
+            "requests": len(self.latencies), "errors": self.errors, "seconds": round(elapsed, 2),
+            "rps": round(len(self.latencies) / elapsed, 1),
+            "p50_ms": round(percentile(self.latencies, 50) * 1000, 2),
+            "p95_ms": round(percentile(self.latencies, 95) * 1000, 2),
+            "p99_ms": round(percentile(self.latencies, 99) * 1000, 2),
+            "peak_rss_mb": round(self.peak_rss / 2**20, 1),
+        }
+        if self.items:
+            out["items_per_s"] = round(self.items / elapsed, 1)
+        out.update(extra or {})
+        return out
+
+
+# `concurrency` workers call send(worker, n) back to back for `duration`
+# seconds; send returns (ok, items processed)
+async def closed_loop(concurrency: int, duration: float, send) -> Recorder:
+    recorder = Recorder()
+    sampler = asyncio.create_task(recorder.sample_memory())
+    deadline = time.perf_counter() + duration
+
+    async def worker(w):
+        n = 0
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                ok, items = await send(w, n)
+            except Exception:
+                ok, items = False, 0
+            recorder.latencies.append(time.perf_counter() - started)
+            recorder.items += items
+            recorder.errors += not ok
+            n += 1
+
+    recorder.started = time.perf_counter()
+    await asyncio.gather(*(worker(w) for w in range(concurrency)))
+    recorder.finished = time.perf_counter()
+    sampler.cancel()
+    return recorder
+
+
+def _reading_payload(datagen, batch_size: int, devices: int, seed: int) -> bytes:
+    batch = list(datagen.readings(batch_size, devices, seed, start=datetime.now(timezone.utc), rate=1000))
+    return json.dumps(batch, default=lambda value: value.isoformat()).encode()
+
+
+async def scenario_login(ctx, args):
+    datagen = ctx["datagen"]
+
+    # own client: the session cookies set by the logins must not leak into other scenarios
+    async with httpx.AsyncClient(base_url=ctx["base_url"], limits=ctx["limits"], timeout=60) as http:
+        async def send(w, n):
+            r = await http.post("/auth/login", data={
+                "username": datagen.username((w * 7919 + n) % args.users), "password": datagen.PASSWORD,
+                "g-recaptcha-response": f"bench-{w}-{n}"})
+            return r.status_code == 303, 0
+
+        return (await closed_loop(args.concurrency, args.duration, send)).result()
+
+
+async def scenario_ingest(ctx, args):
+    payloads = [_reading_payload(ctx["datagen"], args.batch_size, args.devices, seed) for seed in range(20)]
+
+    async def send(w, n):
+        r = await ctx["http"].post("/device/device-data/batch", content=payloads[(w + n) % len(payloads)],
+                                   headers={**ctx["auth"], "content-type": "application/json"})
+        return r.status_code == 200, args.batch_size if r.status_code == 200 else 0
+
+    return (await closed_loop(args.concurrency, args.duration, send)).result({"batch_size": args.batch_size})
+
+
+async def scenario_browse(ctx, args):
+    datagen = ctx["datagen"]
+    rng = random.Random(args.seed)
+    pages = [
+        (3, lambda: "/admin/dashboard"),
+        (2, lambda: "/admin/users"),
+        (4, lambda: "/shipment/manage"),
+        (2, lambda: f"/shipment/manage?goodsType={rng.choice(datagen.GOODS)}&sort=shipmentNumber"),
+        (2, lambda: "/shipment/manage/api?limit=100"),
+        (3, lambda: f"/device/device-data-page?device_id={datagen.device_id(rng.randrange(args.devices))}"),
+        (1, lambda: "/device/device-data-page"),
+        (2, lambda: f"/device/device-data?device_id={datagen.device_id(rng.randrange(args.devices))}&limit=100"),
+        (1, lambda: f"/device/latest/{datagen.device_id(rng.randrange(args.devices))}"),
+    ]
+    weights = [weight for weight, _ in pages]
+
+    async def send(w, n):
+        path = rng.choices(pages, weights)[0][1]()
+        r = await ctx["http"].get(path, headers=ctx["auth"], cookies=ctx["cookies"])
+        return r.status_code == 200, 0
+
+    return (await closed_loop(args.concurrency, args.duration, send)).result()
+
+
+async def scenario_fanout(ctx, args):
+    import websockets
+
+    recorder = Recorder()
+    delivered = []
+    # when the POST carrying each reading was sent, by reading timestamp; the
+    # timestamps themselves run ahead of the clock (rate=1000 from now)
+    sent_at = {}
+    ready = asyncio.Event()
+    connected = 0
+
+    async def subscriber(i):
+        nonlocal connected
+        # half follow one device, half follow them all
+        params = {"queue_size": 1000}
+        if i % 2:
+            params["device_id"] = ctx["datagen"].device_id(i % args.devices)
+        async with websockets.connect(f"{ctx['ws_url']}/device/ws/device-stream?{urlencode(params)}",
+                                      max_queue=None) as ws:
+            connected += 1
+            if connected == args.ws_clients:
+                ready.set()
+            async for message in ws:
+                sent = sent_at.get(datetime.fromisoformat(json.loads(message)["timestamp"]))
+                if sent is not None:
+                    delivered.append(time.perf_counter() - sent)
+
+    clients = [asyncio.create_task(subscriber(i)) for i in range(args.ws_clients)]
+    await asyncio.wait_for(ready.wait(), 30)
+    sampler = asyncio.create_task(recorder.sample_memory())
+    recorder.started = time.perf_counter()
+    deadline = recorder.started + args.duration
+    interval = args.batch_size / args.fanout_rate
+    while time.perf_counter() < deadline:
+        tick = time.perf_counter()
+        payload = _reading_payload(ctx["datagen"], args.batch_size, args.devices, random.randrange(1 << 30))
+        posted = time.perf_counter()
+        for reading in json.loads(payload):
+            sent_at[datetime.fromisoformat(reading["timestamp"])] = posted
+        r = await ctx["http"].post("/device/device-data/batch", content=payload,
+                                   headers={**ctx["auth"], "content-type": "application/json"})
+        recorder.latencies.append(time.perf_counter() - tick)
+        recorder.errors += r.status_code != 200
+        recorder.items += args.batch_size
+        await asyncio.sleep(max(0.0, interval - (time.perf_counter() - tick)))
+    await asyncio.sleep(1.0)  # let queued messages drain
+    recorder.finished = time.perf_counter()
+    sampler.cancel()
+    for client in clients:
+        client.cancel()
+    await asyncio.gather(*clients, return_exceptions=True)
+    return recorder.result({
+        "ws_clients": args.ws_clients, "delivered": len(delivered),
+        "delivered_per_s": round(len(delivered) / (recorder.finished - recorder.started), 1),
+        "delivery_p50_ms": round(percentile(delivered, 50) * 1000, 2),
+        "delivery_p99_ms": round(percentile(delivered, 99) * 1000, 2),
+    })
+
+
+RUNNERS = {"login": scenario_login, "ingest": scenario_ingest, "browse": scenario_browse, "fanout": scenario_fanout}
+
+
+async def _serve(app, port: int):
+    import uvicorn
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    task = asyncio.create_task(server.serve())
+    while not server.started:
+        if task.done():
+            task.result()
+        await asyncio.sleep(0.05)
+    return server, task
+
+
+async def main(args):
+    from benchmarks import datagen
+    from benchmarks.stub_recaptcha import app as stub_app
+
+    stub, stub_task = await _serve(stub_app, args.recaptcha_port)
+    if args.seed_data:
+        started = time.perf_counter()
+        await datagen.seed_database(args.users, args.shipments, args.readings, args.devices, args.seed)
+        print(f"seeded {args.users} users, {args.shipments} shipments, {args.readings} readings "
+              f"in {time.perf_counter() - started:.1f}s")
+
+    from app.main import app
+    port = _free_port()
+    server, server_task = await _serve(app, port)
+    base_url = f"http://127.0.0.1:{port}"
+    limits = httpx.Limits(max_connections=args.concurrency + 10, max_keepalive_connections=args.concurrency + 10)
+    results = {}
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as http:
+        r = await http.post("/auth/token", data={"username": datagen.username(0), "password": datagen.PASSWORD})
+        r.raise_for_status()
+        token = r.json()["access_token"]
+        ctx = {"http": http, "datagen": datagen, "auth": {"Authorization": f"Bearer {token}"},
+               "cookies": {"access_token": token}, "ws_url": base_url.replace("http", "ws", 1),
+               "base_url": base_url, "limits": limits}
+        for name in args.scenarios.split(","):
+            result = await RUNNERS[name](ctx, args)
+            results[name] = result
+            print(f"{name:7s} " + " ".join(f"{k}={v}" for k, v in result.items()))
+
+    server.should_exit = stub.should_exit = True
+    await asyncio.gather(server_task, stub_task)
+    if args.mongo != "uri" or args.drop:
+        from app.db.mongodb import db
+        await db.client.drop_database(db.name)
+    return results
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(__file__)).stdout.strip()
+    except OSError:
+        return ""
+
+
+def save(results: dict, args) -> str:
+    os.makedirs(args.results_dir, exist_ok=True)
+    label = args.label or datetime.now().strftime("%Y%m%d-%H%M%S")
+    path = os.path.join(args.results_dir, f"{label}.json")
+    run = {
+        "label": label, "commit": _git_commit(), "created": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(), "mongo": args.mongo,
+        "args": {k: v for k, v in vars(args).items() if k not in ("compare", "results_dir", "label")},
+        "scenarios": results,
+    }
+    with open(path, "w") as f:
+        json.dump(run, f, indent=2)
+    return path
+
+
+# Prints each scenario's change against `path`; returns the regressions
+def compare(results: dict, path: str) -> list:
+    with open(path) as f:
+        previous = json.load(f)
+    print(f"\ncompared with {previous['label']} ({previous.get('commit') or 'unknown commit'}):")
+    regressions = []
+    for name, result in results.items():
+        before = previous["scenarios"].get(name)
+        if not before:
+            continue
+        changes = []
+        for metric, higher_is_better in (("rps", True), ("p50_ms", False), ("p95_ms", False), ("p99_ms", False),
+                                         ("peak_rss_mb", False)):
+            if not before.get(metric):
+                continue
+            change = (result[metric] - before[metric]) / before[metric]
+            changes.append(f"{metric} {before[metric]} -> {result[metric]} ({change:+.0%})")
+            if metric in ("rps", "p95_ms") and (-change if higher_is_better else change) > REGRESSION_THRESHOLD:
+                regressions.append(f"{name} {metric}")
+        print(f"  {name:7s} " + ", ".join(changes))
+    if regressions:
+        print("regressions: " + ", ".join(regressions))
+    return regressions
+
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--mongo", choices=mongo_standin.KINDS, default="memory")
+    parser.add_argument("--mongod-path")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per scenario")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--shipments", type=int, default=5000)
+    parser.add_argument("--readings", type=int, default=50_000)
+    parser.add_argument("--devices", type=int, default=200)
+    parser.add_argument("--no-seed", dest="seed_data", action="store_false", help="reuse already seeded data")
+    parser.add_argument("--batch-size", type=int, default=500, help="readings per ingest request")
+    parser.add_argument("--ws-clients", type=int, default=200)
+    parser.add_argument("--fanout-rate", type=float, default=2000, help="readings/second during fanout")
+    parser.add_argument("--recaptcha-port", type=int, default=0)
+    parser.add_argument("--drop", action="store_true", help="drop MONGO_DB afterwards with --mongo uri")
+    parser.add_argument("--label")
+    parser.add_argument("--results-dir", default=RESULTS_DIR)
+    parser.add_argument("--compare", help="earlier results file to check for regressions")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    args.recaptcha_port = args.recaptcha_port or _free_port()
+    mongo_standin.use(args.mongo, args.mongod_path)
+    os.environ.setdefault("JWT_SECRET", "bench-secret")
+    os.environ.setdefault("JWT_ALGORITHM", "HS256")
+    os.environ.setdefault("RECAPTCHA_SECRET_KEY", "bench")
+    os.environ["RECAPTCHA_VERIFY_URL"] = f"http://127.0.0.1:{args.recaptcha_port}/recaptcha/api/siteverify"
+    results = asyncio.run(main(args))
+    print(f"\nresults written to {save(results, args)}")
+    if args.compare and compare(results, args.compare):
+        sys.exit(1)
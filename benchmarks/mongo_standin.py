@@ -0,0 +1,83 @@
+# benchmarks/mongo_standin.py
+# The database a benchmark runs against. Must be set up before anything
+# under app/ is imported, since the Motor client is created at import time.
+#   memory  in-process fake (needs mongomock-motor, not in requirements.txt);
+#           no network, but every query scans its collection (no indexes),
+#           so write-heavy scenarios read slower than on a real server
+#   mongod  a throwaway local mongod (binary on PATH or --mongod-path) in a
+#           temporary directory, removed on exit
+#   uri     whatever MONGO_URI points at (scratch database MONGO_DB)
+import atexit
+import os
+import shutil
+import socket
+import subprocess
+import tempfile
+import time
+
+KINDS = ("memory", "mongod", "uri")
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _use_memory():
+    try:
+        import mongomock.collection
+        import mongomock_motor
+        import motor.motor_asyncio
+    except ImportError:
+        raise SystemExit("--mongo memory needs mongomock-motor: pip install mongomock-motor")
+    motor.motor_asyncio.AsyncIOMotorClient = mongomock_motor.AsyncMongoMockClient
+    # the fake returns a sync database from with_options and rejects newer bulk options
+    mongomock_motor.AsyncMongoMockDatabase.with_options = lambda self, **kwargs: self
+    add_update = mongomock.collection.BulkOperationBuilder.add_update
+    mongomock.collection.BulkOperationBuilder.add_update = \
+        lambda self, *args, sort=None, **kwargs: add_update(self, *args, **kwargs)
+    # no time-series collections or change streams in the fake
+    os.environ["DEVICE_TIMESERIES"] = "false"
+    os.environ["DEVICE_CHANGE_STREAM"] = "false"
+    os.environ.setdefault("MONGO_URI", "mongodb://memory")
+
+
+def _use_mongod(mongod_path: str):
+    binary = mongod_path or shutil.which("mongod")
+    if not binary:
+        raise SystemExit("--mongo mongod needs a mongod binary on PATH or --mongod-path")
+    data_dir = tempfile.mkdtemp(prefix="scm-bench-mongod-")
+    port = _free_port()
+    process = subprocess.Popen([binary, "--dbpath", data_dir, "--port", str(port), "--bind_ip", "127.0.0.1",
+                                "--quiet", "--logpath", os.path.join(data_dir, "mongod.log")])
+
+    def stop():
+        process.terminate()
+        try:
+            process.wait(10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+    atexit.register(stop)
+    deadline = time.monotonic() + 30
+    while True:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            break
+        except OSError:
+            if process.poll() is not None or time.monotonic() > deadline:
+                raise SystemExit(f"mongod did not start, see {data_dir}/mongod.log")
+            time.sleep(0.2)
+    os.environ["MONGO_URI"] = f"mongodb://127.0.0.1:{port}"
+
+
+def use(kind: str, mongod_path: str = None):
+    os.environ.setdefault("MONGO_DB", "scm_bench")
+    if kind == "memory":
+        _use_memory()
+    elif kind == "mongod":
+        _use_mongod(mongod_path)
+    elif kind != "uri":
+        raise ValueError(f"Unknown stand-in {kind!r}")
@@ -0,0 +1,38 @@
+# benchmarks/stub_recaptcha.py
+# Local stand-in for Google's siteverify endpoint. Tokens starting with
+# "bad" fail verification; --delay adds latency to every reply.
+#
+#   python -m benchmarks.stub_recaptcha --port 9010 --delay 0.05
+#   RECAPTCHA_VERIFY_URL=http://127.0.0.1:9010/recaptcha/api/siteverify uvicorn app.main:app
+import argparse
+import asyncio
+import os
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+DELAY = float(os.getenv("STUB_RECAPTCHA_DELAY", 0))
+
+
+async def siteverify(request: Request):
+    form = await request.form()
+    if DELAY:
+        await asyncio.sleep(DELAY)
+    token = form.get("response") or ""
+    if token.startswith("bad"):
+        return JSONResponse({"success": False, "error-codes": ["invalid-input-response"]})
+    return JSONResponse({"success": True, "hostname": "localhost"})
+
+
+app = Starlette(routes=[Route("/recaptcha/api/siteverify", siteverify, methods=["POST"])])
+
+
+if __name__ == "__main__":
+    import uvicorn
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=9010)
+    parser.add_argument("--delay", type=float, default=0.0)
+    args = parser.parse_args()
+    DELAY = args.delay
+    uvicorn.run(app, host="127.0.0.1", port=args.port, log_level="warning")
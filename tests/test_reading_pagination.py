@@ -0,0 +1,55 @@
+# tests/test_reading_pagination.py
+# Keyset paging over device readings must return every reading exactly once,
+# also when many share a timestamp and the sort leaves their order open.
+import random
+from datetime import datetime, timedelta
+
+import pytest
+from bson import ObjectId
+
+mongomock = pytest.importorskip("mongomock")
+
+from app.db import device_store
+
+
+def make_readings():
+    start = datetime(2025, 1, 1)
+    docs = []
+    # runs of equal timestamps shorter and longer than a page
+    for second, count in enumerate((1, 7, 2, 3, 10, 1)):
+        for i in range(count):
+            docs.append({"_id": ObjectId(), "device_id": f"D{i}", "timestamp": start - timedelta(seconds=second)})
+    return docs
+
+
+def fetch(collection, query_filter, limit, timeseries, rng):
+    rows = list(collection.find(query_filter))
+    if timeseries:
+        # sorted on timestamp alone: equal timestamps in any order, per query
+        rng.shuffle(rows)
+        rows.sort(key=lambda row: row["timestamp"], reverse=True)
+    else:
+        rows.sort(key=lambda row: (row["timestamp"], row["_id"]), reverse=True)
+    return rows[:limit]
+
+
+@pytest.mark.parametrize("timeseries", [True, False])
+@pytest.mark.parametrize("limit", [1, 3, 7])
+def test_pages_return_each_reading_once(monkeypatch, timeseries, limit):
+    monkeypatch.setattr(device_store, "USE_TIMESERIES", timeseries)
+    collection = mongomock.MongoClient().db.device_data
+    docs = make_readings()
+    collection.insert_many(docs)
+    rng = random.Random(limit)
+
+    seen, after = [], None
+    while True:
+        query_filter = device_store.readings_after_filter(after) if after else {}
+        rows = fetch(collection, query_filter, limit, timeseries, rng)
+        seen += [row["_id"] for row in rows]
+        if len(rows) < limit:
+            break
+        after = device_store.next_readings_cursor(rows, after)
+
+    assert sorted(seen) == sorted(doc["_id"] for doc in docs)
+    assert len(seen) == len(set(seen))